@@ -0,0 +1,665 @@
+"""Static analysis of templates.
+
+Example usage::
+
+    from ckanext.theming import analysis
+    hierarchy = []
+    analysis.discover_template_hierarchy(env, env.get_template("page.html"), hierarchy)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from collections.abc import Mapping
+
+import msgspec
+from jinja2 import Environment, Template, TemplateError, TemplateNotFound, TemplateSyntaxError, nodes
+
+log = logging.getLogger(__name__)
+
+RE_COMPONENT = re.compile(r"(?<!\.)\bui\.(?!util\.)(?P<name>\w+)")
+
+RE_EXTEND = re.compile(
+    r"""
+    \{%-?\s*		(?# tag start)
+    extends\s+		(?# tag name)
+    (?P<name>.+?)	(?# template name. Non-greedy match to exclude leading whitespace)
+    \s*-?%\}		(?# tag end)
+""",
+    re.X,
+)
+
+RE_CKAN_EXTEND = re.compile(
+    r"""
+    \{%-?\s*		(?# tag start)
+    ckan_extends\s+	(?# tag name)
+    \s*-?%\}		(?# tag end)
+""",
+    re.X,
+)
+
+
+RE_INCLUDE = re.compile(
+    r"""
+    \{%-?\s*		(?# tag start)
+    include\s+		(?# tag name)
+    (?P<name>.+?)	(?# template name)
+    \s*-?%\}		(?# tag end)
+    """,
+    re.X,
+)
+
+
+class TemplateInfo(msgspec.Struct):
+    """Facts extracted from the source of a template file.
+
+    :param mtime: Modification time of the file.
+    :param digest: SHA1 hash of the file content.
+    :param components: Names of UI components in order of usage, with
+        duplicates.
+    :param includes: Names of included templates.
+    :param blocks: Names of blocks defined by the template.
+    :param extends: Name of the extended template, if any.
+    :param ckan_extends: Whether the template uses `ckan_extends` tag.
+    :param helpers: Names of called template helpers, with duplicates.
+    :param loop_components: Names of UI components used inside loops, with
+        duplicates.
+    :param loop_helpers: Names of template helpers called inside loops, with
+        duplicates.
+    :param loop_macros: Number of macro calls inside loops.
+    """
+
+    mtime: float
+    digest: str
+    components: list[str] = msgspec.field(default_factory=list)
+    includes: list[str] = msgspec.field(default_factory=list)
+    blocks: list[str] = msgspec.field(default_factory=list)
+    extends: str | None = None
+    ckan_extends: bool = False
+    helpers: list[str] = msgspec.field(default_factory=list)
+    loop_components: list[str] = msgspec.field(default_factory=list)
+    loop_helpers: list[str] = msgspec.field(default_factory=list)
+    loop_macros: int = 0
+
+
+class _IndexFile(msgspec.Struct):
+    version: int
+    entries: dict[str, TemplateInfo]
+
+
+# increase when the set of facts in TemplateInfo changes, to rebuild indexes
+INDEX_VERSION = 2
+
+
+def _const_names(node: nodes.Node) -> list[str]:
+    """Get string literals from template expression."""
+    if isinstance(node, nodes.Const) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (nodes.List, nodes.Tuple)):
+        return [name for item in node.items for name in _const_names(item)]
+    return []
+
+
+def _component_name(node: nodes.Node) -> str | None:
+    """Get component name from `ui.NAME` or `ui["NAME"]` expression."""
+    if isinstance(node, nodes.Getattr) and isinstance(node.node, nodes.Name) and node.node.name == "ui":
+        return node.attr if node.attr != "util" else None
+
+    if (
+        isinstance(node, nodes.Getitem)
+        and isinstance(node.node, nodes.Name)
+        and node.node.name == "ui"
+        and isinstance(node.arg, nodes.Const)
+    ):
+        return str(node.arg.value)
+
+    return None
+
+
+def _macro_names(ast: nodes.Template) -> set[str]:
+    """Get names of macros defined or imported by the template."""
+    names = {node.name for node in ast.find_all(nodes.Macro)}
+    names.update(node.target for node in ast.find_all(nodes.Import))
+    for node in ast.find_all(nodes.FromImport):
+        names.update(item if isinstance(item, str) else item[1] for item in node.names)
+    return names
+
+
+def _collect_call_block(node: nodes.CallBlock, info: TemplateInfo, macros: set[str], in_loop: bool):
+    """Collect calls of `{% call %}` block, counting the called object only once.
+
+    The called object is either a component, collected from the call
+    expression, or a macro.
+    """
+    if in_loop and _component_name(node.call.node) is None:
+        info.loop_macros += 1
+    for child in node.call.iter_child_nodes():
+        _collect_calls(child, info, macros, in_loop)
+    for child in node.iter_child_nodes(exclude=("call",)):
+        _collect_calls(child, info, macros, in_loop)
+
+
+def _collect_calls(node: nodes.Node, info: TemplateInfo, macros: set[str], in_loop: bool = False):  # noqa: C901
+    """Collect components, helpers and macro calls, tracking whether they are inside a loop."""
+    if isinstance(node, nodes.For):
+        for child in node.iter_child_nodes(exclude=("body",)):
+            _collect_calls(child, info, macros, in_loop)
+        for child in node.body:
+            _collect_calls(child, info, macros, True)
+        return
+
+    if isinstance(node, nodes.CallBlock):
+        _collect_call_block(node, info, macros, in_loop)
+        return
+
+    if component := _component_name(node):
+        info.components.append(component)
+        if in_loop:
+            info.loop_components.append(component)
+
+    elif isinstance(node, nodes.Call):
+        func = node.node
+        if isinstance(func, nodes.Getattr) and isinstance(func.node, nodes.Name) and func.node.name == "h":
+            info.helpers.append(func.attr)
+            if in_loop:
+                info.loop_helpers.append(func.attr)
+
+        elif in_loop and (
+            (isinstance(func, nodes.Name) and func.name in macros)
+            or (isinstance(func, nodes.Getattr) and isinstance(func.node, nodes.Name) and func.node.name in macros)
+        ):
+            info.loop_macros += 1
+
+    for child in node.iter_child_nodes():
+        _collect_calls(child, info, macros, in_loop)
+
+
+def parse_template(env: Environment, source: str, name: str | None, filename: str) -> TemplateInfo:
+    """Extract components, includes, blocks and parent from template source.
+
+    Jinja's AST is used, so components referenced without a call, e.g.
+    `ui.util.call(ui.link)`, are detected as well. If template cannot be
+    parsed, regular expressions are used instead.
+    """
+    info = TemplateInfo(
+        mtime=os.path.getmtime(filename),
+        digest=hashlib.sha1(source.encode()).hexdigest(),  # noqa: S324
+    )
+    try:
+        ast = env.parse(source, name, filename)
+    except TemplateSyntaxError:
+        log.debug("Cannot parse %s, falling back to regular expressions", filename)
+        info.components = RE_COMPONENT.findall(source)
+        info.includes = [item.strip("\"'") for item in RE_INCLUDE.findall(source)]
+        if extends := RE_EXTEND.search(source):
+            info.extends = extends.group("name").strip("\"'")
+        info.ckan_extends = bool(RE_CKAN_EXTEND.search(source))
+        return info
+
+    _collect_calls(ast, info, _macro_names(ast))
+
+    for node in ast.find_all(nodes.Include):
+        info.includes.extend(_const_names(node.template))
+
+    info.blocks = [node.name for node in ast.find_all(nodes.Block)]
+
+    if extends := ast.find(nodes.Extends):
+        if RE_CKAN_EXTEND.search(source):
+            info.ckan_extends = True
+        elif names := _const_names(extends.template):
+            info.extends = names[0]
+
+    return info
+
+
+class TemplateIndex:
+    """Cache of facts extracted from template files.
+
+    Entries are persisted into JSON file and reused while modification time
+    or content hash of the file is unchanged.
+
+    Example usage::
+
+        index = TemplateIndex(env, "/tmp/templates.json")
+        components = index.get(tpl.filename).components
+        index.save()
+    """
+
+    entries: dict[str, TemplateInfo]
+
+    def __init__(self, env: Environment, path: str | None = None):
+        self.env = env
+        self.path = path
+        self.entries = {}
+        self._changed = False
+
+        if path and os.path.isfile(path):
+            try:
+                with open(path, "rb") as src:
+                    data = msgspec.json.decode(src.read(), type=_IndexFile)
+            except msgspec.DecodeError:
+                log.warning("Template index %s is corrupted and will be rebuilt", path)
+            else:
+                if data.version == INDEX_VERSION:
+                    self.entries = data.entries
+
+    def get(self, filename: str, name: str | None = None) -> TemplateInfo:
+        """Get facts about the template file, parsing it only when changed."""
+        filename = os.path.normpath(filename)
+        cached = self.entries.get(filename)
+        if cached and cached.mtime == os.path.getmtime(filename):
+            return cached
+
+        with open(filename) as src:
+            source = src.read()
+
+        if cached and cached.digest == hashlib.sha1(source.encode()).hexdigest():  # noqa: S324
+            cached.mtime = os.path.getmtime(filename)
+        else:
+            cached = parse_template(self.env, source, name, filename)
+
+        self.entries[filename] = cached
+        self._changed = True
+        return cached
+
+    def save(self):
+        """Persist the index, if it was changed."""
+        if not self.path or not self._changed:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "wb") as dest:
+            dest.write(msgspec.json.encode(_IndexFile(INDEX_VERSION, self.entries)))
+        self._changed = False
+
+
+def _ckan_parent_name(name: str, filename: str) -> str:
+    """Get name of the template extended by `ckan_extends` tag."""
+    clean_name = name.rsplit("*", 1)[-1]
+    dirname = filename[: -len(clean_name) - 1]
+    return f"*{dirname}*{clean_name}"
+
+
+class HierarchyGraph:
+    """Graph of template inheritance, built lazily and once per run.
+
+    Parent of every template file is resolved only once, so shared ancestors
+    like `page.html` and `base.html` are not analyzed repeatedly. Templates
+    are located by the loader and their facts are read from the index, so
+    templates are not compiled.
+
+    Example usage::
+
+        graph = HierarchyGraph(env)
+        hierarchy, missing = graph.hierarchy(env.get_template("package/read.html"))
+        hierarchy, missing = graph.hierarchy_of(graph.locate("package/read.html"))
+    """
+
+    parents: dict[str, str | None]
+    missing: dict[str, str]
+    blocks: dict[str, set[str]]
+
+    def __init__(self, env: Environment, index: TemplateIndex | None = None):
+        self.env = env
+        self.index = index or TemplateIndex(env)
+        self.parents = {}
+        self.missing = {}
+        self.blocks = {}
+        self._names: dict[str, str | None] = {}
+        self._located: dict[str, str] = {}
+
+    def _register(self, filename: str, name: str | None) -> str:
+        filename = os.path.normpath(filename)
+        if filename not in self._names:
+            self._names[filename] = name
+            self.blocks[filename] = set(self.index.get(filename, name).blocks)
+        return filename
+
+    def add(self, tpl: Template) -> str:
+        """Add template to the graph and get its canonical filename."""
+        return self._register(tpl.filename, tpl.name)  # pyright: ignore[reportArgumentType]
+
+    def locate(self, name: str) -> str:
+        """Add template to the graph by name and get its canonical filename.
+
+        :raises TemplateNotFound: if template cannot be found
+        """
+        if name not in self._located:
+            if self.env.loader is None:
+                raise TemplateNotFound(name)
+
+            _source, filename, _uptodate = self.env.loader.get_source(self.env, name)
+            if not filename:
+                raise TemplateNotFound(name)
+            self._located[name] = self._register(filename, name)
+
+        return self._located[name]
+
+    def parent(self, tpl: Template) -> str | None:
+        """Get filename of the template extended by the template."""
+        return self.parent_of(self.add(tpl))
+
+    def parent_of(self, filename: str) -> str | None:
+        """Get filename of the template extended by the template file added to the graph."""
+        if filename in self.parents:
+            return self.parents[filename]
+
+        name = self._names.get(filename)
+        info = self.index.get(filename, name)
+        parent_name = info.extends or (_ckan_parent_name(name, filename) if info.ckan_extends and name else None)
+        parent = None
+        if parent_name:
+            try:
+                parent = self.locate(parent_name)
+            except TemplateNotFound:
+                self.missing[filename] = parent_name
+
+        self.parents[filename] = parent
+        return parent
+
+    def hierarchy(self, tpl: Template) -> tuple[list[str], str | None]:
+        """Get filenames of templates extended by the template.
+
+        :return: filenames starting from the closest parent and name of the
+            parent template that cannot be found, if any
+        """
+        return self.hierarchy_of(self.add(tpl))
+
+    def hierarchy_of(self, filename: str) -> tuple[list[str], str | None]:
+        """Get filenames of templates extended by the template file added to the graph.
+
+        :return: filenames starting from the closest parent and name of the
+            parent template that cannot be found, if any
+        """
+        hierarchy: list[str] = []
+        while parent := self.parent_of(filename):
+            if parent in hierarchy:
+                break
+            hierarchy.append(parent)
+            filename = parent
+
+        return hierarchy, self.missing.get(filename)
+
+    def unchanged_since(self, name: str | None, since: float) -> bool:
+        """Check if the template and all its parents were not modified after the moment.
+
+        :param name: name of the template
+        :param since: timestamp compared with modification time of files
+        """
+        if not name:
+            return False
+
+        try:
+            filename = self.locate(name)
+        except TemplateNotFound:
+            return False
+
+        hierarchy, missing = self.hierarchy_of(filename)
+        if missing:
+            return False
+
+        try:
+            return all(os.path.getmtime(item) <= since for item in [filename, *hierarchy])
+        except OSError:
+            return False
+
+    def includes(self, tpl: Template) -> list[str]:
+        """Get filenames of templates included by the template."""
+        return self.includes_of(self.add(tpl))
+
+    def includes_of(self, filename: str) -> list[str]:
+        """Get filenames of templates included by the template file added to the graph."""
+        result: list[str] = []
+        for name in self.index.get(filename, self._names.get(filename)).includes:
+            try:
+                result.append(self.locate(name))
+            except TemplateNotFound:  # noqa: PERF203
+                log.debug("Included template %s cannot be found", name)
+        return result
+
+    def edges(self, includes: bool = False) -> list[tuple[str, str, str]]:
+        """Get edges between analyzed templates.
+
+        :param includes: add edges between templates and included templates
+        :return: triples of child filename, parent filename and type of edge
+        """
+        result = [(child, parent, "extends") for child, parent in self.parents.items() if parent]
+        if includes:
+            for filename in list(self._names):
+                result.extend((filename, item, "include") for item in self.includes_of(filename))
+        return result
+
+
+def discover_template_hierarchy(
+    env: Environment,
+    tpl: Template,
+    hierarchy: list[str],
+    all_blocks: dict[str | None, set[str]] | None = None,
+    index: TemplateIndex | None = None,
+) -> str | None:
+    """Collect filenames of templates extended by the template.
+
+    Parents are added to the `hierarchy` list, starting from the closest
+    one. If `all_blocks` is provided, it's populated with blocks defined by
+    every parent. If `index` is provided, it's used instead of reading
+    template files.
+
+    :return: name of the parent template that cannot be found, if any
+    """
+    if index is None:
+        with open(tpl.filename) as src:  # pyright: ignore[reportArgumentType]
+            content = src.read()
+
+        extends = RE_EXTEND.search(content)
+        parent_name = extends.group("name").strip("\"'") if extends else None
+        ckan_extends = bool(RE_CKAN_EXTEND.search(content))
+    else:
+        info = index.get(tpl.filename, tpl.name)  # pyright: ignore[reportArgumentType]
+        parent_name = info.extends
+        ckan_extends = info.ckan_extends
+
+    if not parent_name and ckan_extends:
+        parent_name = _ckan_parent_name(tpl.name, tpl.filename)  # pyright: ignore[reportArgumentType]
+
+    if not parent_name:
+        return None
+
+    try:
+        parent_tpl = env.get_template(parent_name)
+    except TemplateNotFound:
+        return parent_name
+
+    canonical: str = os.path.normpath(parent_tpl.filename)  # pyright: ignore[reportArgumentType, reportCallIssue, reportUnknownVariableType]
+    hierarchy.append(canonical)
+    if all_blocks is not None:
+        all_blocks[canonical] = set(parent_tpl.blocks)
+
+    return discover_template_hierarchy(env, parent_tpl, hierarchy, all_blocks, index)
+
+
+# assumed number of iterations of every loop
+LOOP_ITERATIONS = 10
+# relative costs of template features. Cost of an average UI component is 1
+INCLUDE_COST = 2.0
+MACRO_COST = 1.0
+HELPER_COST = 1.0
+DEPTH_COST = 1.0
+
+
+class TemplateCost(msgspec.Struct):
+    """Estimated relative cost of a template render.
+
+    :param template: Filename of the template.
+    :param cost: Estimated cost, in costs of an average UI component.
+    :param components: Number of UI component references.
+    :param loop_components: Number of UI component references inside loops.
+    :param includes: Number of included templates.
+    :param loop_macros: Number of macro calls inside loops.
+    :param loop_helpers: Number of helper calls inside loops.
+    :param depth: Number of extended templates.
+    """
+
+    template: str
+    cost: float
+    components: int
+    loop_components: int
+    includes: int
+    loop_macros: int
+    loop_helpers: int
+    depth: int
+
+
+def estimate_cost(
+    template: str, info: TemplateInfo, depth: int, weights: Mapping[str, float] | None = None
+) -> TemplateCost:
+    """Estimate relative cost of a template render from its source.
+
+    Everything inside loops is multiplied by the assumed number of
+    iterations.
+
+    :param template: filename of the template
+    :param info: facts about the template
+    :param depth: number of extended templates
+    :param weights: relative costs of UI components. Missing components cost 1
+    """
+    weights = weights or {}
+    loop = Counter(info.loop_components)
+    outside = Counter(info.components) - loop
+
+    cost = sum(weights.get(name, 1.0) * count for name, count in outside.items())
+    cost += LOOP_ITERATIONS * sum(weights.get(name, 1.0) * count for name, count in loop.items())
+    cost += LOOP_ITERATIONS * (MACRO_COST * info.loop_macros + HELPER_COST * len(info.loop_helpers))
+    cost += INCLUDE_COST * len(info.includes) + DEPTH_COST * depth
+
+    return TemplateCost(
+        template=template,
+        cost=cost,
+        components=len(info.components),
+        loop_components=len(info.loop_components),
+        includes=len(info.includes),
+        loop_macros=info.loop_macros,
+        loop_helpers=len(info.loop_helpers),
+        depth=depth,
+    )
+
+
+class CompiledTemplate(msgspec.Struct):
+    """Result of the template compilation.
+
+    :param name: Name of the template.
+    :param filename: Path to the template file.
+    :param duration: Time spent on compilation, in nanoseconds.
+    :param error: Syntax error, if any.
+    :param missing_imports: Imported templates that cannot be found and
+        macros that are not defined by imported templates.
+    :param import_errors: Syntax errors of imported templates and their
+        parents.
+    """
+
+    name: str
+    filename: str
+    duration: int = 0
+    error: str | None = None
+    missing_imports: list[str] = msgspec.field(default_factory=list)
+    import_errors: list[str] = msgspec.field(default_factory=list)
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.error or self.missing_imports or self.import_errors)
+
+
+def _exported_names(env: Environment, name: str) -> set[str]:
+    """Get names of macros and variables defined by the template.
+
+    Names defined by parent templates are included, because the extended
+    template is rendered in the same context when the template is imported.
+
+    :raises TemplateNotFound: template or one of its parents does not exist
+    :raises TemplateSyntaxError: template or one of its parents cannot be
+        parsed
+    """
+    names: set[str] = set()
+    seen: set[str] = set()
+    parent: str | None = name
+    while parent and parent not in seen:
+        current, parent = parent, None
+        seen.add(current)
+        source, filename, _uptodate = env.loader.get_source(env, current)  # pyright: ignore[reportOptionalMemberAccess]
+        ast = env.parse(source, current, filename)
+
+        names.update(node.name for node in ast.find_all(nodes.Macro))
+        names.update(
+            node.target.name
+            for node in ast.body
+            if isinstance(node, nodes.Assign) and isinstance(node.target, nodes.Name)
+        )
+
+        if extends := ast.find(nodes.Extends):
+            if RE_CKAN_EXTEND.search(source) and filename:
+                parent = _ckan_parent_name(current, filename)
+            elif parents := _const_names(extends.template):
+                parent = parents[0]
+
+    return names
+
+
+def _cached_exports(
+    env: Environment, name: str, exports: dict[str, set[str] | TemplateError]
+) -> set[str] | TemplateError:
+    """Get names defined by the template or error raised while loading it."""
+    if name not in exports:
+        try:
+            exports[name] = _exported_names(env, name)
+        except TemplateError as err:
+            exports[name] = err
+
+    return exports[name]
+
+
+def compile_template(
+    env: Environment, name: str, filename: str, exports: dict[str, set[str] | TemplateError] | None = None
+) -> CompiledTemplate:
+    """Compile template file and verify its imports.
+
+    :param exports: cache of names defined by imported templates or errors
+        raised while loading them, shared between calls
+    """
+    if exports is None:
+        exports = {}
+
+    result = CompiledTemplate(name, filename)
+    with open(filename) as src:
+        source = src.read()
+
+    start = time.perf_counter_ns()
+    try:
+        ast = env.parse(source, name, filename)
+        env.compile(ast, name, filename)
+    except TemplateSyntaxError as err:
+        result.error = f"line {err.lineno}: {err.message}"
+        return result
+    finally:
+        result.duration = time.perf_counter_ns() - start
+
+    for node in ast.find_all((nodes.Import, nodes.FromImport)):
+        targets = _const_names(node.template)
+        if not targets:
+            continue
+
+        exported = _cached_exports(env, targets[0], exports)
+        if isinstance(exported, TemplateSyntaxError):
+            result.import_errors.append(f"{exported.name or targets[0]} line {exported.lineno}: {exported.message}")
+
+        elif isinstance(exported, TemplateError):
+            result.missing_imports.append(targets[0])
+
+        elif isinstance(node, nodes.FromImport):
+            for item in node.names:
+                macro = item if isinstance(item, str) else item[0]
+                if macro not in exported:
+                    result.missing_imports.append(f"{targets[0]}:{macro}")
+
+    return result
@@ -1,24 +1,29 @@
 import contextlib
 import fnmatch
+import functools
+import gzip
 import inspect
 import json
 import logging
+import multiprocessing
 import os
 import pprint
 import random
-import re
 import shutil
 import string
+import sys
 import textwrap
 import time
 from collections import Counter, defaultdict
-from collections.abc import Callable, Collection
-from typing import Any
+from collections.abc import Callable, Collection, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.synchronize import Barrier
+from typing import IO, Any
 
 import click
 import flask.signals
 import msgspec
-from jinja2 import Environment, Template, TemplateNotFound
+from jinja2 import Environment, FileSystemLoader, Template, TemplateError, TemplateNotFound
 from jinja2.exceptions import UndefinedError
 from jinja2.runtime import Macro
 from werkzeug.exceptions import NotFound
@@ -27,45 +32,13 @@ from werkzeug.routing import BuildError, Rule
 import ckan.plugins.toolkit as tk
 from ckan import model, types
 
+from . import analysis, fixtures, lib, profiling, reference
 from . import config as cfg
-from . import lib, reference
 
 log = logging.getLogger(__name__)
 
 __all__ = ["theme"]
 
-RE_COMPONENT = re.compile(r"(?<!\.)\bui\.(?!util\.)(?P<name>\w+)")
-
-RE_EXTEND = re.compile(
-    r"""
-    \{%-?\s*		(?# tag start)
-    extends\s+		(?# tag name)
-    (?P<name>.+?)	(?# template name. Non-greedy match to exclude leading whitespace)
-    \s*-?%\}		(?# tag end)
-""",
-    re.X,
-)
-
-RE_CKAN_EXTEND = re.compile(
-    r"""
-    \{%-?\s*		(?# tag start)
-    ckan_extends\s+	(?# tag name)
-    \s*-?%\}		(?# tag end)
-""",
-    re.X,
-)
-
-
-RE_INCLUDE = re.compile(
-    r"""
-    \{%-?\s*		(?# tag start)
-    include\s+		(?# tag name)
-    (?P<name>.+?)	(?# template name)
-    \s*-?%\}		(?# tag end)
-    """,
-    re.X,
-)
-
 
 @click.group(name="theme", short_help="Theme related commands.")
 def theme():
@@ -92,9 +65,18 @@ theme_option = click.option("-t", "--theme", callback=theme_callback)
 
 @contextlib.contextmanager
 def _make_ui(ctx: click.Context, theme: lib.Theme):
-    """Context manager to build the UI for a theme within a Flask app context."""
+    """Context manager to build the UI for a theme within a Flask app context.
+
+    When the theme is not active, templates of the theme are used while the
+    context manager is active.
+    """
     with ctx.meta["flask_app"].app_context() as app_context:
-        yield theme.build_ui(app_context.app)
+        if theme.name == lib.get_active_theme().name:
+            yield theme.build_ui(app_context.app)
+            return
+
+        with lib.use_theme(app_context.app, theme):
+            yield theme.build_ui(app_context.app)
 
 
 @theme.command("list")
@@ -178,6 +160,9 @@ def component_analyze(  # noqa: C901, PLR0912, PLR0915
 
         for component in components:
             comp_func = getattr(ui, component, None)
+            if comp_func:
+                # components are wrapped when profiling is enabled
+                comp_func = inspect.unwrap(comp_func)
             # if not comp_func:
             #     tk.error_shout(f"Unknown component {component}")
             #     continue
@@ -275,11 +260,32 @@ def component_analyze(  # noqa: C901, PLR0912, PLR0915
             click.echo()
 
 
+# sizes of generated collections used to check how render time of components
+# depends on the input
+_argument_sizes = {"empty": 0, "typical": reference.DEFAULT_SAMPLE_SIZE, "large": 100, "huge": 1000}
+
+
 @component.command("check")
 @theme_option
+@click.option(
+    "-n",
+    "--iterations",
+    default=0,
+    type=click.IntRange(min=0),
+    help="Number of timed renders per argument set. Render time is not checked by default.",
+)
+@click.option(
+    "-j", "--jobs", default=1, type=click.IntRange(min=1), help="Number of worker processes that time components."
+)
 @click.pass_context
-def component_check(ctx: click.Context, theme: lib.Theme):  # noqa: C901
-    """Verify that a theme implements all required UI components."""
+def component_check(ctx: click.Context, theme: lib.Theme, iterations: int, jobs: int):  # noqa: C901
+    """Verify that a theme implements all required UI components.
+
+    When iterations are set, every component is also rendered with arguments
+    generated from the component reference, using empty, typical and large
+    collections, to detect components whose render time grows faster than
+    their input.
+    """
     categorized: dict[reference.Category, set[str]] = defaultdict(set)
     component_ref = lib.get_active_theme().component_reference()
     for name, info in component_ref.items():
@@ -337,6 +343,129 @@ def component_check(ctx: click.Context, theme: lib.Theme):  # noqa: C901
                     for name, err in values.items():
                         click.secho(f"\t  {click.style(name, bold=True)}: {err}")
 
+            if iterations:
+                names = sorted(theme_components.intersection(component_ref))
+                _check_scaling(ctx.meta["flask_app"], ui, names, iterations, jobs)
+
+
+def _measure_component_scaling(name: str, iterations: int) -> profiling.ComponentScaling:
+    """Time the component with argument sets of different size."""
+    app = _worker_app
+    ui = _worker_ui
+    if not app or not ui:
+        msg = "Worker UI is not initialized"
+        raise RuntimeError(msg)
+
+    component_ref = lib.get_active_theme().component_reference()
+    arguments = {
+        label: (size, reference.make_arguments(component_ref[name], size)) for label, size in _argument_sizes.items()
+    }
+    with app.test_request_context():
+        return profiling.measure_scaling(name, getattr(ui, name), arguments, iterations)
+
+
+def _check_scaling(app: types.CKANApp, ui: lib.UI, names: list[str], iterations: int, jobs: int):
+    """Time components with argument sets of different size and report results.
+
+    Growth rate compares renders of the same component inside one process, so
+    components can be timed in parallel, as long as there are enough idle CPU
+    cores.
+    """
+    global _worker_app, _worker_ui  # noqa: PLW0603
+
+    measure = functools.partial(_measure_component_scaling, iterations=iterations)
+    _worker_app = app
+    _worker_ui = ui
+    try:
+        with contextlib.ExitStack() as stack:
+            if jobs > 1:
+                context = multiprocessing.get_context("fork")
+                # workers must not share database connections of the parent process
+                executor = stack.enter_context(ProcessPoolExecutor(jobs, mp_context=context, initializer=_detach_db))
+                timings = executor.map(measure, names)
+            else:
+                timings = map(measure, names)
+
+            bar = stack.enter_context(
+                click.progressbar(timings, length=len(names), file=sys.stderr, label="Timing components")
+            )
+            results = list(bar)
+    finally:
+        _worker_app = None
+        _worker_ui = None
+
+    failed = [
+        (result.component, label, item.error)
+        for result in results
+        for label, item in result.results.items()
+        if item.error
+    ]
+    if failed:
+        click.secho(f"{len(failed)} renders failed with generated arguments", fg="yellow")
+        for name, label, error in failed:
+            click.secho(f"\t{click.style(name, bold=True)} ({label}): {error}")
+
+    width = max((len(result.component) for result in results), default=0)
+    header = "".join(f"{label:>10}" for label in _argument_sizes)
+    click.secho(f"  {'':<{width}}{header}{'growth':>8}", fg="yellow")
+    for result in results:
+        cells = "".join(
+            f"{'-':>10}" if item.error else f"{item.duration / item.iterations / 1000:>8.1f}us"
+            for item in (result.results[label] for label in _argument_sizes)
+        )
+        exponent = result.exponent
+        growth = f"{exponent:>8.2f}" if exponent is not None else f"{'-':>8}"
+        click.secho(f"  {result.component:<{width}}{cells}{growth}", fg="red" if result.superlinear else None)
+
+    superlinear = [result.component for result in results if result.superlinear]
+    if superlinear:
+        click.secho(
+            f"{len(superlinear)} components render time grows super-linearly with the input size."
+            + "\nLook for nested loops over arguments",
+            fg="yellow",
+        )
+        click.secho("\t" + ", ".join(superlinear), fg="red")
+    else:
+        click.secho("Render time of all components grows linearly with the input size", fg="green")
+
+
+@component.command("benchmark")
+@theme_option
+@click.pass_context
+@click.argument("components", nargs=-1)
+@click.option("-n", "--iterations", default=1000, type=click.IntRange(min=1), help="Number of renders per component.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+def component_benchmark(ctx: click.Context, theme: lib.Theme, components: Collection[str], iterations: int, fmt: str):
+    """Measure render speed of UI components using arguments from the component reference."""
+    component_ref = theme.component_reference()
+    results: list[profiling.ComponentBenchmark] = []
+
+    with _make_ui(ctx, theme) as ui, ctx.meta["flask_app"].test_request_context():
+        names = components or sorted(ui)
+        with click.progressbar(names, file=sys.stderr) as bar:
+            for name in bar:
+                func = getattr(ui, name, None)
+                if func is None:
+                    results.append(profiling.ComponentBenchmark(name, error="Component is not implemented"))
+                    continue
+
+                args = reference.make_arguments(component_ref[name])
+                results.append(profiling.benchmark_component(name, func, args, iterations))
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(results))
+        return
+
+    width = max((len(result.component) for result in results), default=0)
+    click.secho(f"  {'':<{width}}{'ops/sec':>12}{'mean':>12}{'size':>9}", fg="yellow")
+    for result in sorted(results, key=lambda result: result.ops):
+        if result.error:
+            click.secho(f"  {result.component:<{width}}  {result.error}", fg="red")
+            continue
+
+        mean = result.duration / result.iterations / 1000
+        click.echo(f"  {result.component:<{width}}{result.ops:>12.1f}{mean:>10.2f}us{result.size:>9}")
+
 
 @theme.group()
 def template():
@@ -422,6 +551,8 @@ def template_analyze(  # noqa: C901
         click.secho(f"Available templates({len(templates)}):")
 
     env = ctx.meta["flask_app"].jinja_env
+    index = analysis.TemplateIndex(env, cfg.template_index())
+    graph = analysis.HierarchyGraph(env, index)
     for name in sorted(templates):
         try:
             tpl = env.get_template(name)
@@ -438,16 +569,13 @@ def template_analyze(  # noqa: C901
             else os.path.normpath(tpl.filename)
         )
 
-        with open(tpl.filename) as src:
-            content = src.read()
-
-        if includes := RE_INCLUDE.findall(content):
-            click.secho(click.style("Includes: ", fg="yellow") + ", ".join(i for i in sorted(set(includes))))
+        info = index.get(tpl.filename, name)
+        if info.includes:
+            click.secho(click.style("Includes: ", fg="yellow") + ", ".join(sorted(set(info.includes))))
 
+        hierarchy, hierarchy_break = graph.hierarchy(tpl)
         all_blocks: dict[str | None, set[str]] = {tpl.filename: set(tpl.blocks)}
-        hierarchy: list[str] = []
-
-        hierarchy_break = _discover_template_hierarchy(env, tpl, hierarchy, all_blocks)
+        all_blocks.update({item: graph.blocks[item] for item in hierarchy})
 
         # click.secho(click.style("Extends: ", fg="yellow") + parent_name)
         if hierarchy:
@@ -469,37 +597,7 @@ def template_analyze(  # noqa: C901
 
         click.echo()
 
-
-def _discover_template_hierarchy(
-    env: Environment, tpl: Template, hierarchy: list[str], all_blocks: dict[str | None, set[str]] | None = None
-) -> str | None:
-    parent_name = None
-
-    with open(tpl.filename) as src:  # pyright: ignore[reportArgumentType]
-        content = src.read()
-
-    if extends := RE_EXTEND.search(content):
-        parent_name = extends.group("name").strip("\"'")
-
-    elif RE_CKAN_EXTEND.search(content):
-        clean_name = tpl.name.rsplit("*", 1)[-1]  # pyright: ignore[reportOptionalMemberAccess]
-        dirname = tpl.filename[: -len(clean_name) - 1]  # pyright: ignore[reportOptionalSubscript, reportUnknownVariableType]
-        parent_name = f"*{dirname}*{clean_name}"
-
-    else:
-        return None
-
-    try:
-        parent_tpl = env.get_template(parent_name)
-    except TemplateNotFound:
-        return parent_name
-
-    canonical: str = os.path.normpath(parent_tpl.filename)  # pyright: ignore[reportArgumentType, reportCallIssue, reportUnknownVariableType]
-    hierarchy.append(canonical)
-    if all_blocks is not None:
-        all_blocks[canonical] = set(parent_tpl.blocks)
-
-    return _discover_template_hierarchy(env, parent_tpl, hierarchy, all_blocks)
+    index.save()
 
 
 @template.command("component-usage")
@@ -517,25 +615,27 @@ def template_component_usage(  # noqa: C901, PLR0912
     counter: Counter[str] = Counter()
 
     all_templates: set[str] = set()
+    index = analysis.TemplateIndex(env, cfg.template_index())
+    graph = analysis.HierarchyGraph(env, index)
 
     path = os.path.abspath(path)
     for name in env.list_templates():
         if not name.endswith(".html"):
             continue
-        tpl = env.get_template(name)
-        filename: str = os.path.normpath(tpl.filename)  # pyright: ignore[reportCallIssue, reportArgumentType, reportUnknownVariableType]
-        if os.path.normpath(filename).startswith(path):
+        # facts are read from the index, so templates are not compiled
+        filename = graph.locate(name)
+        if filename.startswith(path):
             all_templates.add(filename)
 
-        hierarchy: list[str] = []
-        _discover_template_hierarchy(env, tpl, hierarchy)
+        hierarchy, _missing = graph.hierarchy_of(filename)
         all_templates.update(filename for filename in hierarchy if filename.startswith(path))
 
     for filename in all_templates:
-        with open(filename) as src:
-            for component_name in RE_COMPONENT.findall(src.read()):
-                used[component_name].add(filename)
-                counter.update([component_name])
+        for component_name in index.get(filename).components:
+            used[component_name].add(filename)
+            counter.update([component_name])
+
+    index.save()
 
     with _make_ui(ctx, theme) as ui:
         existing = set(ui)
@@ -573,6 +673,297 @@ def template_component_usage(  # noqa: C901, PLR0912
             click.echo(f"{count:> 5}: {name}")
 
 
+def _component_weights(storage: str, name: str) -> dict[str, float]:
+    """Get relative render time of UI components from saved benchmark results.
+
+    Weight is the mean exclusive render time of the component, divided by
+    the median of mean times of all components.
+    """
+    stats: dict[str, profiling.ComponentStats] = defaultdict(profiling.ComponentStats)
+    root = os.path.join(storage, name)
+    for filename in sorted(os.listdir(root)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(root, filename), "rb") as src:
+            data = msgspec.json.decode(src.read(), type=profiling.EndpointBenchmark)
+        for component, value in data.components.items():
+            stats[component].merge(value)
+
+    means = {component: value.exclusive / value.calls for component, value in stats.items() if value.calls}
+    median = profiling.percentile(sorted(means.values()), 50) if means else 0
+    return {component: mean / median for component, mean in means.items()} if median else {}
+
+
+@template.command("cost")
+@click.pass_context
+@click.argument("templates", nargs=-1)
+@click.option("--benchmark", help="Name of saved benchmark results with component timings.")
+@click.option("--storage", default=".benchmarks", help="Directory with saved benchmark results.")
+@click.option("--path", default="/", help="Only analyze templates under the specified path.")
+@click.option("--limit", default=20, type=int, help="Number of templates to show.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+def template_cost(  # noqa: PLR0913
+    ctx: click.Context,
+    templates: Collection[str],
+    benchmark: str | None,
+    storage: str,
+    path: str,
+    limit: int,
+    fmt: str,
+):
+    """Estimate relative render cost of templates without rendering them."""
+    env: Environment = ctx.meta["flask_app"].jinja_env
+    index = analysis.TemplateIndex(env, cfg.template_index())
+    graph = analysis.HierarchyGraph(env, index)
+
+    weights: dict[str, float] = {}
+    if benchmark:
+        if not os.path.isdir(os.path.join(storage, benchmark)):
+            tk.error_shout(f"Benchmark {benchmark} does not exist")
+            raise click.Abort
+        weights = _component_weights(storage, benchmark)
+        if not weights:
+            log.warning("Benchmark %s does not contain component timings", benchmark)
+
+    if not templates:
+        templates = [name for name in env.list_templates() if name.endswith(".html")]
+
+    path = os.path.abspath(path)
+    costs: dict[str, analysis.TemplateCost] = {}
+    for name in templates:
+        try:
+            tpl = env.get_template(name)
+        except TemplateNotFound:
+            tk.error_shout(f"Template {name} does not exist")
+            continue
+
+        filename = graph.add(tpl)
+        if filename in costs or not filename.startswith(path):
+            continue
+
+        hierarchy, _missing = graph.hierarchy(tpl)
+        costs[filename] = analysis.estimate_cost(filename, index.get(filename, name), len(hierarchy), weights)
+
+    index.save()
+    ranked = sorted(costs.values(), key=lambda item: item.cost, reverse=True)[:limit]
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(ranked))
+        return
+
+    columns = ["cost", "components", "in loops", "includes", "loop macros", "loop helpers", "depth"]
+    click.secho("".join(f"{col:>13}" for col in columns) + "  template", fg="yellow")
+    for item in ranked:
+        values = [
+            item.components,
+            item.loop_components,
+            item.includes,
+            item.loop_macros,
+            item.loop_helpers,
+            item.depth,
+        ]
+        click.echo(f"{item.cost:>13.1f}" + "".join(f"{value:>13}" for value in values) + f"  {item.template}")
+
+
+def _theme_templates(app: types.CKANApp, theme: lib.Theme) -> list[tuple[str, str]]:
+    """Get templates of the theme chain and templates shadowed by them.
+
+    :return: sorted pairs of template name and filename
+    """
+    roots: list[str] = []
+    info: lib.BaseTheme | None = theme
+    while info:
+        if (path := info.template_path()) and os.path.isdir(path):
+            roots.append(os.path.realpath(path))
+        info = lib.get_theme(info.parent) if info.parent else None
+
+    names = {
+        os.path.relpath(os.path.join(path, file), root)
+        for root in roots
+        for path, _, files in os.walk(root)
+        for file in files
+        if file.endswith(".html")
+    }
+
+    searchpaths = [
+        path
+        for loader in lib.iter_loaders(app.jinja_loader)
+        if isinstance(loader, FileSystemLoader)
+        for path in loader.searchpath
+    ]
+    result = {
+        (name, os.path.realpath(os.path.join(root, name)))
+        for name in names
+        for root in [*roots, *searchpaths]
+        if os.path.isfile(os.path.join(root, name))
+    }
+    return sorted(result)
+
+
+def _compile_templates(tasks: list[tuple[str, str]]) -> list[analysis.CompiledTemplate]:
+    """Compile templates inside a forked process."""
+    app = _worker_app
+    if not app:
+        msg = "Worker application is not initialized"
+        raise RuntimeError(msg)
+
+    exports: dict[str, set[str] | TemplateError] = {}
+    with app.app_context():
+        return [analysis.compile_template(app.jinja_env, name, filename, exports) for name, filename in tasks]
+
+
+@template.command("compile")
+@click.pass_context
+@theme_option
+@click.option(
+    "-j", "--jobs", default=os.cpu_count() or 1, type=click.IntRange(min=1), help="Number of worker processes."
+)
+@click.option("--limit", default=10, type=int, help="Number of the slowest templates to show.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+def template_compile(ctx: click.Context, theme: lib.Theme, jobs: int, limit: int, fmt: str):
+    """Compile templates of the theme and report errors and compile time."""
+    global _worker_app  # noqa: PLW0603
+
+    app = ctx.meta["flask_app"]
+    tasks = _theme_templates(app, theme)
+
+    _worker_app = app
+    try:
+        if jobs > 1:
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+                chunks = executor.map(_compile_templates, [tasks[idx::jobs] for idx in range(jobs)])
+                results = [result for chunk in chunks for result in chunk]
+        else:
+            results = _compile_templates(tasks)
+    finally:
+        _worker_app = None
+
+    results.sort(key=lambda result: (result.name, result.filename))
+    failed = [result for result in results if result.failed]
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(results))
+    else:
+        total = sum(result.duration for result in results) / profiling.NS_IN_MS
+        click.echo(f"Compiled {len(results)} templates in {total:.1f}ms")
+
+        click.secho("Slowest templates:", fg="yellow")
+        for result in sorted(results, key=lambda result: result.duration, reverse=True)[:limit]:
+            click.echo(f"  {result.duration / profiling.NS_IN_MS:>9.3f}ms  {result.filename}")
+
+        for result in failed:
+            click.secho(result.filename, fg="red", bold=True)
+            if result.error:
+                click.echo(f"  Syntax error at {result.error}")
+            for item in result.missing_imports:
+                click.echo(f"  Undefined import: {item}")
+            for item in result.import_errors:
+                click.echo(f"  Syntax error in imported {item}")
+
+    if failed:
+        tk.error_shout(f"{len(failed)} templates failed to compile")
+        raise click.Abort
+
+
+@template.command("graph")
+@click.pass_context
+@click.argument("templates", nargs=-1)
+@click.option("--format", "fmt", default="dot", type=click.Choice(["dot", "json"]))
+@click.option("--includes", is_flag=True, help="Add edges to included templates.")
+@click.option("--path", default="/", help="Only export templates under the specified path.")
+def template_graph(ctx: click.Context, templates: Collection[str], fmt: str, includes: bool, path: str):
+    """Export graph of template inheritance."""
+    env: Environment = ctx.meta["flask_app"].jinja_env
+    index = analysis.TemplateIndex(env, cfg.template_index())
+    graph = analysis.HierarchyGraph(env, index)
+
+    if not templates:
+        templates = [name for name in env.list_templates() if name.endswith(".html")]
+
+    for name in templates:
+        try:
+            graph.hierarchy_of(graph.locate(name))
+        except TemplateNotFound:  # noqa: PERF203
+            tk.error_shout(f"Template {name} does not exist")
+
+    path = os.path.abspath(path)
+    edges = [edge for edge in graph.edges(includes) if edge[0].startswith(path)]
+    missing = {child: parent for child, parent in graph.missing.items() if child.startswith(path)}
+    index.save()
+
+    if fmt == "json":
+        nodes = {filename: False for edge in edges for filename in edge[:2]}
+        nodes.update(dict.fromkeys(missing, False))
+        nodes.update(dict.fromkeys(missing.values(), True))
+        edges.extend((child, parent, "extends") for child, parent in missing.items())
+        click.echo(
+            json.dumps(
+                {
+                    "nodes": [{"id": name, "missing": nodes[name]} for name in sorted(nodes)],
+                    "edges": [{"source": child, "target": parent, "type": kind} for child, parent, kind in edges],
+                    "missing": missing,
+                }
+            )
+        )
+        return
+
+    click.echo("digraph templates {")
+    click.echo("  rankdir=BT;")
+    for child, parent, kind in edges:
+        style = " [style=dashed]" if kind == "include" else ""
+        click.echo(f"  {json.dumps(child)} -> {json.dumps(parent)}{style};")
+    for child, parent in missing.items():
+        click.echo(f"  {json.dumps(child)} -> {json.dumps(parent)} [color=red];")
+    click.echo("}")
+
+
+@template.command("render")
+@click.pass_context
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--endpoints", multiple=True, help="Render fixtures only of the specified endpoints.")
+@click.option("-n", "--iterations", default=100, type=click.IntRange(min=1), help="Number of renders per fixture.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+def template_render(ctx: click.Context, directory: str, endpoints: tuple[str, ...], iterations: int, fmt: str):
+    """Render templates from fixtures produced by `endpoint dump --fixtures`.
+
+    Templates are rendered with saved context variables inside the request
+    to the URL of the fixture endpoint, without calling endpoints, so the
+    render time does not include database and search queries made by views.
+    """
+    app = ctx.meta["flask_app"]
+    results: dict[str, profiling.Series] = {}
+    failed: dict[str, str] = {}
+
+    items = [fixture for fixture in fixtures.iter_fixtures(directory) if not endpoints or fixture.endpoint in endpoints]
+    with click.progressbar(items, file=sys.stderr) as bar:
+        for fixture in bar:
+            samples: list[int] = []
+            try:
+                with fixtures.request_context(app, fixture):
+                    for _ in range(iterations):
+                        start = time.perf_counter_ns()
+                        fixtures.render(fixture)
+                        samples.append(time.perf_counter_ns() - start)
+            except Exception as err:  # noqa: BLE001
+                failed[fixture.endpoint] = f"{type(err).__name__}: {err}"
+                continue
+
+            results[fixture.endpoint] = profiling.Series.from_samples(samples)
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode({"results": results, "failed": failed}))
+    else:
+        click.echo("Time per render:")
+        _echo_summaries({name: series.summary for name, series in results.items()})
+
+    if failed:
+        tk.error_shout(f"{len(failed)} fixtures cannot be rendered:")
+        for name, error in failed.items():
+            tk.error_shout(f"  {name}: {error}")
+        raise click.Abort
+
+
 @theme.group()
 def endpoint():
     """Endpoint-level commands."""
@@ -700,13 +1091,14 @@ def endpoint_observe(  # noqa: PLR0913
             )
 
 
-def _profile_endpoint(  # noqa: C901, PLR0913
+def _profile_endpoint(  # noqa: C901, PLR0912, PLR0913, PLR0915
     endpoint: str,
     params: dict[str, Any],
     app: types.CKANApp,
     output: str,
     lib: str,
     user: model.User | None = None,
+    queries: bool = False,
 ):
     import cProfile  # noqa: PLC0415
 
@@ -729,6 +1121,8 @@ def _profile_endpoint(  # noqa: C901, PLR0913
             raise click.Abort from err
 
     profilers: dict[str, Any] = {}
+    memory = profiling.MemoryTracker(app.jinja_env)
+    helpers = profiling.HelperCollector(endpoint)
 
     def start_render(app: Any, template: Template, context: dict[str, Any]):  # pyright: ignore[reportUnusedParameter]
         if lib == "cprofile":
@@ -736,14 +1130,22 @@ def _profile_endpoint(  # noqa: C901, PLR0913
             pr = cProfile.Profile()
             profilers[template.name or ""] = pr
             pr.enable()
+        elif lib == "tracemalloc":
+            memory.start()
+        elif lib == "helpers":
+            helpers.start_render(template.name or "")
 
     def end_render(app: Any, template: Template, context: dict[str, Any]):  # pyright: ignore[reportUnusedParameter]
         if lib == "cprofile":
             profilers[template.name or ""].disable()
+        elif lib == "tracemalloc":
+            memory.stop(template.name or "")
+        elif lib == "helpers":
+            helpers.end_render()
 
     with app.test_request_context(url):  # noqa: SIM117
         with flask.signals.before_render_template.connected_to(start_render):
-            with flask.signals.template_rendered.connected_to(end_render):
+            with flask.signals.template_rendered.connected_to(end_render), _query_tracking(endpoint, queries) as sql:
                 if user:
                     tk.login_user(user)
                 if lib == "pyinstrument":
@@ -752,7 +1154,18 @@ def _profile_endpoint(  # noqa: C901, PLR0913
                 elif lib == "cprofile":
                     profilers[endpoint] = cProfile.Profile()
                     profilers[endpoint].enable()
-                app.full_dispatch_request()
+
+                if lib == "tracemalloc":
+                    with memory:
+                        memory.start()
+                        app.full_dispatch_request()
+                        memory.stop(endpoint)
+                elif lib == "helpers":
+                    with profiling.wrap_helpers(helpers.wrap):
+                        app.full_dispatch_request()
+                else:
+                    app.full_dispatch_request()
+
                 if lib == "pyinstrument":
                     profilers[endpoint].stop()
 
@@ -764,15 +1177,160 @@ def _profile_endpoint(  # noqa: C901, PLR0913
         elif lib == "cprofile":
             pr.dump_stats(os.path.join(output, f"{name}.profile"))
 
+    for tpl, render in memory.renders.items():
+        name = tpl.replace("/", "__")
+        with open(os.path.join(output, f"{name}.memory.txt"), "w") as dest:
+            _echo_memory(render, dest)
+
+    if lib == "helpers":
+        with open(os.path.join(output, f"{endpoint}.helpers.txt"), "w") as dest:
+            _echo_helpers(helpers.templates, dest)
+
+    if sql:
+        _write_queries(output, endpoint, sql.templates)
+
+
+def _echo_helpers(templates: dict[str, dict[str, profiling.HelperStats]], file: IO[str] | None = None):
+    """Print calls of template helpers made by every template."""
+    ranked = sorted(templates.items(), key=lambda item: sum(stats.duration for stats in item[1].values()), reverse=True)
+    for template, helpers in ranked:
+        click.secho(template, fg="yellow", file=file)
+        width = max(map(len, helpers), default=0)
+        click.echo(f"  {'':<{width}}{'calls':>9}{'time':>11}{'redundant':>11}", file=file)
+        for name, stats in sorted(helpers.items(), key=lambda item: item[1].duration, reverse=True):
+            click.echo(
+                f"  {name:<{width}}{stats.calls:>9}{stats.duration / profiling.NS_IN_MS:>9.3f}ms{stats.redundant:>11}",
+                file=file,
+            )
+
+
+def _echo_memory(render: profiling.MemoryRender, file: IO[str] | None = None):
+    """Print peak memory and top allocation sites of a render."""
+    click.echo(f"Template: {render.template}", file=file)
+    click.echo(f"Peak: {render.peak / 1024:.1f} KiB", file=file)
+    click.echo(f"Allocated: {render.allocated / 1024:.1f} KiB", file=file)
+    click.echo("Top allocation sites:", file=file)
+    for site in render.sites:
+        click.echo(f"  {site.filename}:{site.lineno}: {site.size / 1024:.1f} KiB in {site.count} blocks", file=file)
+
+
+def _trace_endpoint(  # noqa: PLR0913
+    endpoint: str,
+    params: dict[str, Any],
+    app: types.CKANApp,
+    output: str,
+    user: model.User | None = None,
+    queries: bool = False,
+):
+    try:
+        url = tk.url_for(endpoint, **params)
+    except BuildError as err:
+        tk.error_shout(err)
+        raise click.Abort from err
+
+    tracer = profiling.Tracer()
+
+    def wrap_template(template: Template, func: Any):
+        return tracer.wrap_generator(template.name or "", "template", func)
+
+    with (
+        _component_profiling(),
+        profiling.wrap_templates(app.jinja_env, wrap_template),
+        profiling.wrap_helpers(lambda name, func: tracer.wrap(f"h.{name}", "helper", func)),
+    ):
+        # build UI, jinja's render cache and wrappers of templates before the
+        # traced request, so that their cost does not appear in the trace
+        with app.test_request_context(url):
+            if user:
+                tk.login_user(user)
+            try:
+                app.full_dispatch_request()
+            except NotFound as err:
+                tk.error_shout(err)
+                raise click.Abort from err
+            finally:
+                profiling.pop_collector()
+
+        tracer.reset()
+        with app.test_request_context(url), _query_tracking(endpoint, queries) as sql:
+            if user:
+                tk.login_user(user)
+            setattr(tk.g, profiling.COLLECTOR_KEY, profiling.TracingCollector(tracer))
+            try:
+                with tracer.span(endpoint, "dispatch", url=url):
+                    app.full_dispatch_request()
+            finally:
+                profiling.pop_collector()
+
+    with open(os.path.join(output, f"{endpoint}.trace.json"), "wb") as dest:
+        dest.write(tracer.dump())
+
+    if sql:
+        _write_queries(output, endpoint, sql.templates)
+
+
+@contextlib.contextmanager
+def _query_tracking(endpoint: str, enabled: bool = True) -> Iterator[profiling.QueryCollector | None]:
+    """Record SQL queries executed by the request and by every rendered template."""
+    if not enabled:
+        yield None
+        return
+
+    collector = profiling.QueryCollector(endpoint)
+
+    def start_render(app: Any, template: Template, context: dict[str, Any]):  # pyright: ignore[reportUnusedParameter]
+        collector.start_render(template.name or "")
+
+    def end_render(app: Any, template: Template, context: dict[str, Any]):  # pyright: ignore[reportUnusedParameter]
+        collector.end_render()
+
+    with (
+        flask.signals.before_render_template.connected_to(start_render),
+        flask.signals.template_rendered.connected_to(end_render),
+        profiling.track_queries(model.meta.engine, collector),
+    ):
+        yield collector
+
+
+def _write_queries(output: str, endpoint: str, queries: dict[str, profiling.QueryStats]):
+    with open(os.path.join(output, f"{endpoint}.queries.txt"), "w") as dest:
+        _echo_queries(queries, 1, len(queries), dest)
+
+
+def _echo_queries(queries: dict[str, profiling.QueryStats], iterations: int, limit: int, file: IO[str] | None = None):
+    """Print per-request SQL queries of the request and templates with the most repeated statements."""
+    ranked = sorted(queries.items(), key=lambda item: item[1].count, reverse=True)[:limit]
+    width = max((len(name) for name, _ in ranked), default=0)
+    click.secho(f"  {'':<{width}}{'renders':>9}{'queries':>9}{'time':>11}", fg="yellow", file=file)
+    for name, stats in ranked:
+        click.echo(
+            f"  {name:<{width}}{stats.renders / iterations:>9.1f}{stats.count / iterations:>9.1f}"
+            + f"{stats.duration / iterations / profiling.NS_IN_MS:>9.3f}ms",
+            file=file,
+        )
+        suspicious = stats.n_plus_one()
+        for statement, count in stats.most_repeated(3):
+            if count <= stats.renders:
+                continue
+            flag = "  possible N+1" if statement in suspicious else ""
+            click.secho(
+                f"    {count / iterations:>7.1f}x {textwrap.shorten(statement, 100)}{flag}",
+                fg="red" if flag else None,
+                file=file,
+            )
+
 
 @endpoint.command("profile", context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
 @click.pass_context
 @click.argument("endpoint")
 @click.option("--auth-user")
 @click.option("--output", default=".")
-@click.option("--lib", default="cprofile", type=click.Choice(["cprofile", "pyinstrument"]))
+@click.option(
+    "--lib", default="cprofile", type=click.Choice(["cprofile", "pyinstrument", "trace", "tracemalloc", "helpers"])
+)
+@click.option("--queries", is_flag=True, help="Record SQL queries of every template.")
 def endpoint_profile(  # noqa: PLR0913
-    ctx: click.Context, endpoint: str, auth_user: str, output: str, lib: str
+    ctx: click.Context, endpoint: str, auth_user: str, output: str, lib: str, queries: bool
 ):
     """Profile the render time of templates used by a Flask endpoint."""
     app = ctx.meta["flask_app"]
@@ -786,80 +1344,531 @@ def endpoint_profile(  # noqa: PLR0913
             tk.error_shout("Extra arguments must follow the format: NAME=VALUE")
             raise click.Abort from err
 
-        _profile_endpoint(endpoint, params, app, output, lib, user=user)
+        if lib == "trace":
+            _trace_endpoint(endpoint, params, app, output, user=user, queries=queries)
+        else:
+            _profile_endpoint(endpoint, params, app, output, lib, user=user, queries=queries)
 
 
-def _benchmark_endpoint(
+def _benchmark_endpoint(  # noqa: PLR0913
     endpoint: str,
     params: dict[str, Any],
     app: types.CKANApp,
     user: model.User | None = None,
     timeout: int = 5,
-) -> dict[str, Any]:
+    warmup: int = 1,
+    progress: bool = True,
+    components: bool = False,
+    queries: bool = False,
+) -> profiling.EndpointBenchmark:
     try:
         url = tk.url_for(endpoint, **params)
     except BuildError as err:
         tk.error_shout(err)
         raise click.Abort from err
 
-    # build jinja's render cache to standardize performance of following requests
-    with app.test_request_context(url):
-        if user:
-            tk.login_user(user)
-        try:
-            app.full_dispatch_request()
-        except NotFound as err:
-            tk.error_shout(err)
-            raise click.Abort from err
+    with _component_profiling() if components else contextlib.nullcontext():
+        return _measure_endpoint(endpoint, url, app, user, timeout, warmup, progress, queries)
+
+
+@contextlib.contextmanager
+def _component_profiling():
+    """Temporarily instrument UI components to record their render time."""
+    unset = cfg.PROFILE_COMPONENTS not in tk.config
+    original = tk.config.get(cfg.PROFILE_COMPONENTS)
+    tk.config[cfg.PROFILE_COMPONENTS] = True
+    lib.UIManager.reset()
+    try:
+        yield
+    finally:
+        if unset:
+            tk.config.pop(cfg.PROFILE_COMPONENTS, None)
+        else:
+            tk.config[cfg.PROFILE_COMPONENTS] = original
+        lib.UIManager.reset()
 
-    measurements: Counter[str] = Counter()
-    moments = {}
 
-    def start_request(app: Any):  # pyright: ignore[reportUnusedParameter]
-        moments[endpoint] = time.time()
+def _measure_endpoint(  # noqa: PLR0912, PLR0913, PLR0915, C901
+    endpoint: str,
+    url: str,
+    app: types.CKANApp,
+    user: model.User | None,
+    timeout: int,
+    warmup: int,
+    progress: bool,
+    queries: bool = False,
+) -> profiling.EndpointBenchmark:
+    # build jinja's render cache to standardize performance of following requests
+    for _ in range(warmup):
+        with app.test_request_context(url):
+            if user:
+                tk.login_user(user)
+            try:
+                app.full_dispatch_request()
+            except NotFound as err:
+                tk.error_shout(err)
+                raise click.Abort from err
+            finally:
+                profiling.pop_collector()
+
+    total: list[int] = []
+    dispatch: list[int] = []
+    templates: dict[str, list[int]] = defaultdict(list)
+    components: dict[str, profiling.ComponentStats] = defaultdict(profiling.ComponentStats)
+    sql: dict[str, profiling.QueryStats] = defaultdict(profiling.QueryStats)
+    iteration: Counter[str] = Counter()
+    rendered: list[int] = []
+    stack: list[int] = []
+    body = b""
 
     def start_render(app: Any, template: Template, context: dict[str, Any]):  # pyright: ignore[reportUnusedParameter]
-        measurements[endpoint] += time.time() - moments[endpoint]
-        moments[template.name] = time.time()
+        stack.append(time.perf_counter_ns())
 
     def end_render(app: Any, template: Template, context: dict[str, Any]):  # pyright: ignore[reportUnusedParameter]
-        measurements[template.name or ""] += time.time() - moments[template.name]
+        spent = time.perf_counter_ns() - stack.pop()
+        iteration[template.name or ""] += spent
+        # nested renders(snippets) are already included into the parent
+        if not stack:
+            rendered.append(spent)
 
-    start = time.time()
-    step = 0
+    start = time.perf_counter_ns()
+    deadline = start + timeout * 1_000_000_000
 
-    with click.progressbar(range(100), show_percent=True) as bar:
+    bar_ctx = click.progressbar(range(100), show_percent=True, file=sys.stderr) if progress else None
+    with bar_ctx or contextlib.nullcontext() as bar:
         while True:
-            step += 1
+            iteration.clear()
+            rendered.clear()
+            stack.clear()
             with app.test_request_context(url):  # noqa: SIM117
-                with flask.signals.request_started.connected_to(start_request):
-                    with flask.signals.before_render_template.connected_to(start_render):
-                        with flask.signals.template_rendered.connected_to(end_render):
-                            if user:
-                                tk.login_user(user)
-                            app.full_dispatch_request()
-
-            spent = time.time() - start
-            bar.pos = int(spent / timeout * 100)
-            bar.render_progress()
-
-            if spent > timeout:
+                with flask.signals.before_render_template.connected_to(start_render):
+                    with flask.signals.template_rendered.connected_to(end_render):
+                        if user:
+                            tk.login_user(user)
+                        with _query_tracking(endpoint, queries) as collected:
+                            request_start = time.perf_counter_ns()
+                            response = app.full_dispatch_request()
+                            spent = time.perf_counter_ns() - request_start
+                        body = response.get_data()
+                        if collected:
+                            for name, stats in collected.templates.items():
+                                sql[name].merge(stats)
+                        if collector := profiling.pop_collector():
+                            for name, stats in collector.stats.items():
+                                components[name].merge(stats)
+
+            total.append(spent)
+            dispatch.append(spent - sum(rendered))
+            for name, value in iteration.items():
+                templates[name].append(value)
+
+            now = time.perf_counter_ns()
+            if bar:
+                bar.pos = min(int((now - start) / (deadline - start) * 100), 100)
+                bar.render_progress()
+
+            if now > deadline:
                 break
 
-    return {"measurements": {name: time / step for name, time in measurements.items()}, "iterations": step}
+    return profiling.EndpointBenchmark(
+        endpoint=endpoint,
+        url=url,
+        warmup=warmup,
+        iterations=len(dispatch),
+        total=profiling.Series.from_samples(total),
+        dispatch=profiling.Series.from_samples(dispatch),
+        templates={name: profiling.Series.from_samples(values) for name, values in templates.items()},
+        components=dict(components),
+        queries=dict(sql),
+        size=len(body),
+        compressed=len(gzip.compress(body)),
+    )
+
+
+def _echo_components(
+    components: dict[str, profiling.ComponentStats], iterations: int, limit: int, by_size: bool = False
+):
+    """Print a table with per-request timings of the slowest or heaviest components."""
+    ranked = sorted(components.items(), key=lambda item: item[1].size if by_size else item[1].exclusive, reverse=True)[
+        :limit
+    ]
+    width = max((len(name) for name, _ in ranked), default=0)
+    columns = ["calls", "inclusive", "exclusive", "depth", "bytes"]
+    click.secho(f"  {'':<{width}}" + "".join(f"{col:>11}" for col in columns), fg="yellow")
+    for name, stats in ranked:
+        click.echo(
+            f"  {name:<{width}}{stats.calls / iterations:>11.1f}"
+            + f"{stats.inclusive / iterations / profiling.NS_IN_MS:>9.3f}ms"
+            + f"{stats.exclusive / iterations / profiling.NS_IN_MS:>9.3f}ms"
+            + f"{stats.max_depth:>11}"
+            + f"{stats.size // iterations:>11}"
+        )
+
+
+def _load_budget(budget: str | None) -> profiling.WeightBudget | None:
+    """Read page size limits from the file or from the configured file."""
+    budget = budget or cfg.weight_budget()
+    if not budget:
+        return None
+
+    try:
+        return profiling.WeightBudget.load(budget)
+    except (OSError, msgspec.ValidationError, msgspec.DecodeError) as err:
+        tk.error_shout(f"Cannot read weight budget {budget}: {err}")
+        raise click.Abort from err
+
+
+def _check_budget(budget: profiling.WeightBudget, results: Collection[profiling.EndpointBenchmark]):
+    """Fail if any page exceeds its size limit."""
+    violations = [message for data in results for message in budget.check(data)]
+    if violations:
+        tk.error_shout("Page weight budget exceeded:\n" + "\n".join(f"  {message}" for message in violations))
+        raise click.Abort
+
+
+def _echo_summaries(summaries: dict[str, profiling.Summary]):
+    """Print a table with statistics of measured durations."""
+    columns = ["min", "p50", "p95", "p99", "stddev"]
+    width = max(map(len, summaries), default=0)
+    click.secho(f"  {'':<{width}}" + "".join(f"{col:>11}" for col in columns), fg="yellow")
+    for name, summary in summaries.items():
+        values = "".join(f"{getattr(summary, col):>9.3f}ms" for col in columns)
+        click.echo(f"  {name:<{width}}{values}")
+
+
+def _benchmark_path(storage: str, name: str, endpoint: str) -> str:
+    """Get path to the stored benchmark results."""
+    return os.path.join(storage, name, f"{endpoint}.json")
+
+
+def _echo_comparisons(comparisons: dict[str, profiling.Comparison], err: bool = False):
+    """Print a table with changes of the median durations."""
+    width = max(map(len, comparisons), default=0)
+    for name, comparison in comparisons.items():
+        if not comparison.is_significant():
+            color = None
+        elif comparison.delta > 0:
+            color = "red"
+        else:
+            color = "green"
+
+        click.secho(
+            f"  {name:<{width}}{comparison.baseline.p50:>9.3f}ms -> {comparison.current.p50:>9.3f}ms"
+            + f"{comparison.delta:>+9.2f}%  p={comparison.p_value:.3f}",
+            fg=color,
+            err=err,
+        )
 
 
 @endpoint.command("benchmark", context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
 @click.pass_context
 @click.argument("endpoint")
 @click.option("--auth-user")
-@click.option("--timeout", default=5, type=int)
-def endpoint_benchmark(  # noqa: PLR0913
-    ctx: click.Context, endpoint: str, auth_user: str, timeout: int
+@click.option("--timeout", default=5, type=int, help="Duration of measurements in seconds.")
+@click.option("--warmup", default=1, type=click.IntRange(min=1), help="Number of requests made before measurements.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+@click.option("--components", is_flag=True, help="Measure render time of every UI component.")
+@click.option("--queries", is_flag=True, help="Record SQL queries of every template.")
+@click.option("--limit", default=20, type=int, help="Number of the slowest components to show.")
+@click.option("--storage", default=".benchmarks", help="Directory with saved benchmark results.")
+@click.option("--save", help="Save results under the specified name.")
+@click.option("--compare", help="Compare results with the ones saved under the specified name.")
+@click.option(
+    "--fail-above",
+    type=float,
+    help="Fail if median render time of any template grows by more than PERCENT. Requires --compare.",
+)
+@click.option("--budget", help="YAML or JSON file with page size limits. Fail if the page exceeds its limit.")
+def endpoint_benchmark(  # noqa: PLR0913, PLR0912, PLR0915, C901
+    ctx: click.Context,
+    endpoint: str,
+    auth_user: str,
+    timeout: int,
+    warmup: int,
+    fmt: str,
+    components: bool,
+    queries: bool,
+    limit: int,
+    storage: str,
+    save: str | None,
+    compare: str | None,
+    fail_above: float | None,
+    budget: str | None,
 ):
     """Benchmark the render time of templates used by a Flask endpoint."""
     app = ctx.meta["flask_app"]
     user = model.User.get(auth_user)
+    limits = _load_budget(budget)
+
+    baseline = None
+    if compare:
+        try:
+            with open(_benchmark_path(storage, compare, endpoint), "rb") as src:
+                baseline = msgspec.json.decode(src.read(), type=profiling.EndpointBenchmark)
+        except FileNotFoundError as err:
+            tk.error_shout(f"Benchmark {compare} does not contain results for {endpoint}")
+            raise click.Abort from err
+
+    elif fail_above is not None:
+        tk.error_shout("--fail-above requires --compare")
+        raise click.Abort
+
+    with app.app_context():
+        try:
+            params = dict(arg.split("=") for arg in ctx.args)
+        except ValueError as err:
+            tk.error_shout("Extra arguments must follow the format: NAME=VALUE")
+            raise click.Abort from err
+
+        data = _benchmark_endpoint(
+            endpoint, params, app, user=user, timeout=timeout, warmup=warmup, components=components, queries=queries
+        )
+
+    if save:
+        dest = _benchmark_path(storage, save, endpoint)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as file:
+            file.write(msgspec.json.encode(data))
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(data))
+    else:
+        click.echo(f"Total number of iterations: {data.iterations}")
+        click.echo(f"Page weight: {data.size} bytes, {data.compressed} bytes gzip-compressed")
+        click.echo("Time per request:")
+        _echo_summaries({name: series.summary for name, series in data.all_series().items()})
+        if data.components:
+            click.echo("Components per request(sorted by exclusive time):")
+            _echo_components(data.components, data.iterations, limit)
+            click.echo("Components per request(sorted by produced bytes):")
+            _echo_components(data.components, data.iterations, limit, by_size=True)
+        if data.queries:
+            click.echo("SQL queries per request(sorted by number of queries):")
+            _echo_queries(data.queries, data.iterations, limit)
+
+    regressions: list[str] = []
+    if baseline:
+        comparisons = data.compare(baseline)
+        # keep stdout parsable when results are printed in JSON
+        click.secho(f"Comparison with {compare}(median):", err=fmt == "json")
+        _echo_comparisons(comparisons, err=fmt == "json")
+
+        if fail_above is not None:
+            regressions = [
+                name
+                for name, comparison in comparisons.items()
+                if name in data.templates and comparison.is_significant() and comparison.delta > fail_above
+            ]
+
+    if limits:
+        _check_budget(limits, [data])
+
+    if regressions:
+        tk.error_shout(f"Render time increased by more than {fail_above}%: {', '.join(regressions)}")
+        raise click.Abort
+
+
+@endpoint.command("compare", context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
+@click.pass_context
+@click.argument("endpoint")
+@click.option("-t", "--theme", "themes", multiple=True, required=True, help="Theme to compare.")
+@click.option("--auth-user")
+@click.option("--timeout", default=5, type=int, help="Duration of measurements per theme in seconds.")
+@click.option("--warmup", default=1, type=click.IntRange(min=1), help="Number of requests made before measurements.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+def endpoint_compare(  # noqa: PLR0913
+    ctx: click.Context,
+    endpoint: str,
+    themes: tuple[str, ...],
+    auth_user: str,
+    timeout: int,
+    warmup: int,
+    fmt: str,
+):
+    """Benchmark a Flask endpoint under every theme and compare render time and HTML size."""
+    app = ctx.meta["flask_app"]
+    user = model.User.get(auth_user)
+
+    try:
+        infos = [lib.get_theme(name) for name in themes]
+    except KeyError as err:
+        tk.error_shout(f"Theme {err} is not registered")
+        raise click.Abort from err
+
+    results: dict[str, profiling.ThemeBenchmark] = {}
+    with app.app_context():
+        try:
+            params = dict(arg.split("=") for arg in ctx.args)
+        except ValueError as err:
+            tk.error_shout("Extra arguments must follow the format: NAME=VALUE")
+            raise click.Abort from err
+
+        for info in infos:
+            click.secho(f"Benchmarking {info.name}", fg="yellow", err=True)
+            with lib.use_theme(app, info):
+                data = _benchmark_endpoint(endpoint, params, app, user=user, timeout=timeout, warmup=warmup)
+            results[info.name] = profiling.ThemeBenchmark(theme=info.name, benchmark=data)
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(list(results.values())))
+        return
+
+    medians = {theme: result.medians() for theme, result in results.items()}
+    names = list(dict.fromkeys(name for values in medians.values() for name in values))
+    width = max(map(len, names))
+    columns = max(*map(len, results), 11)
+
+    click.echo("Median time per request:")
+    click.secho(f"  {'':<{width}}" + "".join(f"{name:>{columns + 2}}" for name in results), fg="yellow")
+    for name in names:
+        row = ""
+        for values in medians.values():
+            value = f"{values[name]:.3f}ms" if name in values else "-"
+            row += f"{value:>{columns + 2}}"
+        click.echo(f"  {name:<{width}}{row}")
+
+    click.echo("HTML size:")
+    click.echo(
+        f"  {'':<{width}}" + "".join(f"{result.benchmark.size / 1024:>{columns}.1f}KB" for result in results.values())
+    )
+
+
+# application shared with forked worker processes
+_worker_app: types.CKANApp | None = None
+
+# UI shared with forked processes that time components
+_worker_ui: lib.UI | None = None
+
+# barrier that holds forked load test processes until all of them are started
+_worker_barrier: Barrier | None = None
+
+# seconds to wait until all load test processes are started
+LOADTEST_START_TIMEOUT = 60
+
+
+def _loadtest_worker(url: str, user: str | None, threads: int, duration: int) -> profiling.LoadTestWorker:
+    """Send requests from multiple threads of the current process."""
+    app = _worker_app
+    if not app:
+        msg = "Worker application is not initialized"
+        raise RuntimeError(msg)
+
+    started = time.monotonic_ns()
+    deadline = started + duration * 1_000_000_000
+
+    def target() -> tuple[list[int], int]:
+        latencies: list[int] = []
+        errors = 0
+        try:
+            auth_obj = model.User.get(user) if user else None
+            while time.monotonic_ns() < deadline:
+                with app.test_request_context(url):
+                    if auth_obj:
+                        tk.login_user(auth_obj)
+                    start = time.perf_counter_ns()
+                    try:
+                        resp = app.full_dispatch_request()
+                    except Exception:  # noqa: BLE001
+                        errors += 1
+                        continue
+
+                    spent = time.perf_counter_ns() - start
+                    if resp.status_code >= 500:  # noqa: PLR2004
+                        errors += 1
+                    else:
+                        latencies.append(spent)
+        finally:
+            model.Session.remove()
+
+        return latencies, errors
+
+    latencies: list[int] = []
+    errors = 0
+    with ThreadPoolExecutor(threads) as executor:
+        for thread_latencies, thread_errors in executor.map(lambda _: target(), range(threads)):
+            latencies.extend(thread_latencies)
+            errors += thread_errors
+
+    return profiling.LoadTestWorker(latencies, errors, started, time.monotonic_ns())
+
+
+def _detach_db():
+    """Drop database connections inherited from the parent process."""
+    model.Session.remove()
+    model.meta.engine.dispose(close=False)  # pyright: ignore[reportOptionalMemberAccess]
+
+
+def _loadtest_process(url: str, user: str | None, threads: int, duration: int) -> profiling.LoadTestWorker:
+    """Run load test worker inside a forked process, once all processes are started."""
+    _detach_db()
+    if _worker_barrier:
+        _worker_barrier.wait(LOADTEST_START_TIMEOUT)
+    return _loadtest_worker(url, user, threads, duration)
+
+
+def _loadtest_endpoint(  # noqa: PLR0913
+    endpoint: str,
+    params: dict[str, Any],
+    app: types.CKANApp,
+    user: str | None = None,
+    threads: int = 1,
+    processes: int = 1,
+    duration: int = 10,
+) -> profiling.LoadTest:
+    global _worker_app, _worker_barrier  # noqa: PLW0603
+
+    try:
+        url = tk.url_for(endpoint, **params)
+    except BuildError as err:
+        tk.error_shout(err)
+        raise click.Abort from err
+
+    # build jinja's render cache before workers are forked
+    with app.test_request_context(url):
+        if auth_obj := model.User.get(user):
+            tk.login_user(auth_obj)
+        try:
+            app.full_dispatch_request()
+        except NotFound as err:
+            tk.error_shout(err)
+            raise click.Abort from err
+
+    _worker_app = app
+    try:
+        if processes > 1:
+            context = multiprocessing.get_context("fork")
+            _worker_barrier = context.Barrier(processes)
+            with ProcessPoolExecutor(processes, mp_context=context) as executor:
+                futures = [executor.submit(_loadtest_process, url, user, threads, duration) for _ in range(processes)]
+                results = [future.result() for future in futures]
+        else:
+            results = [_loadtest_worker(url, user, threads, duration)]
+    finally:
+        _worker_app = None
+        _worker_barrier = None
+
+    return profiling.LoadTest.aggregate(endpoint, url, threads, results)
+
+
+@endpoint.command("loadtest", context_settings={"allow_extra_args": True, "ignore_unknown_options": True})
+@click.pass_context
+@click.argument("endpoint")
+@click.option("--auth-user")
+@click.option("--threads", default=1, type=click.IntRange(min=1), help="Number of threads in every process.")
+@click.option("--processes", default=1, type=click.IntRange(min=1), help="Number of forked processes.")
+@click.option("--duration", default=10, type=click.IntRange(min=1), help="Duration of the test in seconds.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+def endpoint_loadtest(  # noqa: PLR0913
+    ctx: click.Context,
+    endpoint: str,
+    auth_user: str | None,
+    threads: int,
+    processes: int,
+    duration: int,
+    fmt: str,
+):
+    """Request a Flask endpoint concurrently and measure throughput."""
+    app = ctx.meta["flask_app"]
 
     with app.app_context():
         try:
@@ -868,19 +1877,116 @@ def endpoint_benchmark(  # noqa: PLR0913
             tk.error_shout("Extra arguments must follow the format: NAME=VALUE")
             raise click.Abort from err
 
-        data = _benchmark_endpoint(endpoint, params, app, user=user, timeout=timeout)
-        click.echo(f"Total number of iterations: {data['iterations']}")
-        click.echo("Average time:")
-        for name, time_data in data["measurements"].items():
-            if name == endpoint:
-                name += "(without template rendering)"  # noqa: PLW2901
-            click.echo(f"\t{name}: {time_data * 100:.3f}ms")
+        data = _loadtest_endpoint(
+            endpoint, params, app, user=auth_user, threads=threads, processes=processes, duration=duration
+        )
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(data))
+        return
+
+    click.echo(f"Concurrency: {processes} process(es) x {threads} thread(s)")
+    click.echo(f"Requests: {data.latency.summary.count}, errors: {data.errors}")
+    click.echo(f"Throughput: {data.throughput:.2f} req/s")
+    click.echo("Latency:")
+    _echo_summaries({endpoint: data.latency.summary})
+
+
+def _iter_endpoint_params(
+    app: types.CKANApp, source_data: reference.Source, endpoints: Collection[str] = ()
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Iterate over GET variants of endpoints with URL parameters from the dump source.
+
+    Endpoints matching ignore patterns of the source are skipped, as well as
+    variants that require parameters missing from the source.
+    """
+    url_map: dict[str, list[Rule]] = app.url_map._rules_by_endpoint
+    for name, rules in url_map.items():
+        if endpoints and name not in endpoints:
+            continue
+
+        if any(fnmatch.fnmatch(name, pattern) for pattern in source_data.ignore):
+            continue
+
+        for rule in rules:
+            if rule.methods and "GET" not in rule.methods:
+                continue
+
+            try:
+                params = reference.make_params(name, rule.arguments, source_data, rule.defaults or {})
+            except KeyError as err:
+                log.warning("Source does not contain value for %s", err)
+                continue
+
+            # TODO: handle different variants
+            params.update(source_data.args.get(name, {}))
+            yield name, params
 
 
 def _dump_encoder(value: Any):
     return f"<INVALID JSON: {value}>"
 
 
+def _dump_endpoints(  # noqa: PLR0913
+    tasks: list[tuple[str, dict[str, Any]]],
+    app: types.CKANApp,
+    user: str | None,
+    ignore: Collection[str],
+    verbose: bool,
+    fixtures_dir: str | None = None,
+) -> dict[str, Any]:
+    """Observe endpoints and collect their templates and context variables.
+
+    When `fixtures_dir` is set, context variables of every endpoint are saved
+    there as render fixtures.
+
+    :raises tk.ObjectNotFound: if endpoint cannot be found
+    """
+    auth_obj = model.User.get(user)
+    result: dict[str, Any] = {}
+    for name, params in tasks:
+        try:
+            data = _observe_endpoint(name, params, app, user=auth_obj)
+        except tk.ObjectNotFound as err:
+            msg = f"Endpoint {name} with params {params} caused 404"
+            raise tk.ObjectNotFound(msg) from err
+
+        result[name] = {
+            "template": data["template"].name,
+            "context_types": {key: type(value).__name__ for key, value in data["context"].items() if key not in ignore},
+        }
+        if verbose:
+            result[name]["context_variables"] = {
+                key: value for key, value in data["context"].items() if key not in ignore
+            }
+        if fixtures_dir and data["template"].name:
+            fixture = fixtures.capture(name, params, data["template"].name, data["context"], ignore)
+            fixtures.save(fixture, fixtures_dir)
+
+    return result
+
+
+def _dump_process(
+    tasks: list[tuple[str, dict[str, Any]]],
+    user: str | None,
+    ignore: Collection[str],
+    verbose: bool,
+    fixtures_dir: str | None,
+):
+    """Observe endpoints inside a forked process.
+
+    :return: serialized results, because context variables cannot be pickled
+    """
+    app = _worker_app
+    if not app:
+        msg = "Worker application is not initialized"
+        raise RuntimeError(msg)
+
+    _detach_db()
+    with app.app_context():
+        return json.dumps(_dump_endpoints(tasks, app, user, ignore, verbose, fixtures_dir), default=_dump_encoder)
+
+
 @endpoint.command("dump")
 @click.pass_context
 @click.option("--user")
@@ -889,7 +1995,19 @@ def _dump_encoder(value: Any):
 @click.option("--source")
 @click.option("--show-source", is_flag=True)
 @click.option("-v", "--verbose", is_flag=True)
-def endpoint_dump(  # noqa: PLR0912, PLR0913, C901
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1), help="Number of forked worker processes.")
+@click.option(
+    "--since",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Previous dump. Endpoints with unchanged templates are copied from it.",
+)
+@click.option(
+    "--fixtures",
+    "fixtures_dir",
+    type=click.Path(file_okay=False),
+    help="Save template and context variables of every endpoint as render fixtures into directory.",
+)
+def endpoint_dump(  # noqa: PLR0913
     ctx: click.Context,
     user: str | None,
     ignore: tuple[str, ...],
@@ -897,50 +2015,169 @@ def endpoint_dump(  # noqa: PLR0912, PLR0913, C901
     verbose: bool,
     source: str,
     show_source: bool,
+    jobs: int,
+    since: str | None,
+    fixtures_dir: str | None,
 ):
     """Dump templates and context variables used by Flask endpoints in JSON format."""
+    global _worker_app  # noqa: PLW0603
+
     app = ctx.meta["flask_app"]
-    url_map: dict[str, list[Rule]] = app.url_map._rules_by_endpoint
 
-    auth_obj = model.User.get(user)
     source_data = reference.get_source(source)
     if show_source:
         click.echo(msgspec.yaml.encode(source_data))
         return
 
+    previous: dict[str, Any] = {}
+    if since:
+        with open(since) as src:
+            previous = json.load(src)
+
     result: dict[str, Any] = {}
 
     with app.app_context():
-        for name, rules in url_map.items():
-            if endpoints and name not in endpoints:
-                continue
+        tasks = list(_iter_endpoint_params(app, source_data, endpoints))
+        order = [name for name, _ in tasks]
+        if previous:
+            since_mtime = os.path.getmtime(since)  # pyright: ignore[reportArgumentType]
+            graph = analysis.HierarchyGraph(app.jinja_env)
+            reused = {
+                name
+                for name, _ in tasks
+                if name in previous
+                and (not fixtures_dir or os.path.exists(fixtures.fixture_path(fixtures_dir, name)))
+                and (not verbose or "context_variables" in previous[name])
+                and graph.unchanged_since(previous[name]["template"], since_mtime)
+            }
+            result.update({name: previous[name] for name in reused})
+            tasks = [(name, params) for name, params in tasks if name not in reused]
 
-            if any(fnmatch.fnmatch(name, pattern) for pattern in source_data.ignore):
-                continue
+        try:
+            if jobs > 1 and len(tasks) > 1:
+                # variants of the same endpoint are observed by the same worker
+                # in order to keep the last one, as in sequential mode
+                workers = {name: idx % jobs for idx, name in enumerate(dict.fromkeys(name for name, _ in tasks))}
+                chunks = [[task for task in tasks if workers[task[0]] == idx] for idx in range(jobs)]
+
+                _worker_app = app
+                context = multiprocessing.get_context("fork")
+                with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+                    futures = [
+                        executor.submit(_dump_process, chunk, user, ignore, verbose, fixtures_dir)
+                        for chunk in chunks
+                        if chunk
+                    ]
+                    for future in futures:
+                        result.update(json.loads(future.result()))
+            else:
+                result.update(_dump_endpoints(tasks, app, user, ignore, verbose, fixtures_dir))
 
-            for rule in rules:
-                if rule.methods and "GET" not in rule.methods:
-                    continue
+        except tk.ObjectNotFound as err:
+            tk.error_shout(err.message)
+            raise click.Abort from err
 
-                params = reference.make_params(name, rule.arguments, source_data, rule.defaults or {})
-                # TODO: handle different variants
-                params.update(source_data.args.get("name", {}))
+        finally:
+            _worker_app = None
 
-                try:
-                    data = _observe_endpoint(name, params, app, user=auth_obj)
-                except tk.ObjectNotFound as err:
-                    tk.error_shout(f"Endpoint {name} with params {params} caused 404")
-                    raise click.Abort from err
-
-                result[name] = {
-                    "template": data["template"].name,
-                    "context_types": {
-                        key: type(value).__name__ for key, value in data["context"].items() if key not in ignore
-                    },
-                }
-                if verbose:
-                    result[name]["context_variables"] = {
-                        key: value for key, value in data["context"].items() if key not in ignore
-                    }
+    # keep the order of endpoints independent of workers and reused entries
+    result = {name: result[name] for name in dict.fromkeys(order) if name in result}
 
     click.echo(json.dumps(result, default=_dump_encoder))
+
+
+@endpoint.command("sweep")
+@click.pass_context
+@click.option("--user")
+@click.option("--endpoints", multiple=True)
+@click.option("--source")
+@click.option("--timeout", default=1, type=int, help="Duration of measurements for every endpoint in seconds.")
+@click.option("--warmup", default=1, type=click.IntRange(min=1), help="Number of requests made before measurements.")
+@click.option("--limit", default=20, type=int, help="Number of rows in every ranking.")
+@click.option("--format", "fmt", default="text", type=click.Choice(["text", "json"]))
+@click.option("--components", is_flag=True, help="Rank UI components by the bytes of produced markup.")
+@click.option("--budget", help="YAML or JSON file with page size limits. Fail if any page exceeds its limit.")
+def endpoint_sweep(  # noqa: PLR0913
+    ctx: click.Context,
+    user: str | None,
+    endpoints: tuple[str, ...],
+    source: str | None,
+    timeout: int,
+    warmup: int,
+    limit: int,
+    fmt: str,
+    components: bool,
+    budget: str | None,
+):
+    """Benchmark every endpoint and rank the slowest and heaviest endpoints and templates."""
+    app = ctx.meta["flask_app"]
+    auth_obj = model.User.get(user)
+    source_data = reference.get_source(source)
+    limits = _load_budget(budget)
+
+    result: dict[str, profiling.EndpointBenchmark] = {}
+
+    with app.app_context():
+        candidates = list(_iter_endpoint_params(app, source_data, endpoints))
+        with click.progressbar(candidates, label="Benchmarking", file=sys.stderr) as bar:
+            for name, params in bar:
+                # only the first GET variant of the endpoint is measured
+                if name in result:
+                    continue
+
+                try:
+                    result[name] = _benchmark_endpoint(
+                        name,
+                        params,
+                        app,
+                        user=auth_obj,
+                        timeout=timeout,
+                        warmup=warmup,
+                        progress=False,
+                        components=components,
+                    )
+                except click.Abort:
+                    continue
+                except Exception:  # noqa: BLE001
+                    log.exception("Cannot benchmark endpoint %s", name)
+                    continue
+
+    if fmt == "json":
+        click.echo(msgspec.json.encode(result))
+    else:
+        _echo_sweep(result, limit)
+
+    if limits:
+        _check_budget(limits, result.values())
+
+
+def _echo_sweep(result: dict[str, profiling.EndpointBenchmark], limit: int):
+    """Print rankings of endpoints, templates and components."""
+    click.secho(f"Slowest endpoints(median of {len(result)}):", fg="yellow")
+    ranked = sorted(result.values(), key=lambda data: data.total.summary.p50, reverse=True)
+    width = max((len(data.endpoint) for data in ranked), default=0)
+    for data in ranked[:limit]:
+        click.echo(
+            f"  {data.endpoint:<{width}}{data.total.summary.p50:>9.3f}ms"
+            + f"  render share: {data.render_share:>5.1f}%"
+        )
+
+    templates = profiling.slowest_templates(result.values())
+    click.secho("Slowest templates(median):", fg="yellow")
+    width = max((len(name) for name, *_ in templates), default=0)
+    for name, median, data in templates[:limit]:
+        share = median / data.total.summary.p50 * 100 if data.total.summary.p50 else 0
+        click.echo(f"  {name:<{width}}{median:>9.3f}ms  {share:>5.1f}% of {data.endpoint}")
+
+    click.secho("Heaviest endpoints:", fg="yellow")
+    ranked = sorted(result.values(), key=lambda data: data.size, reverse=True)
+    width = max((len(data.endpoint) for data in ranked), default=0)
+    for data in ranked[:limit]:
+        click.echo(f"  {data.endpoint:<{width}}{data.size:>11} bytes{data.compressed:>11} bytes gzip")
+
+    sizes = profiling.heaviest_components(result.values())
+    if sizes:
+        click.secho("Heaviest components(bytes per request of all endpoints):", fg="yellow")
+        width = max((len(name) for name in sizes), default=0)
+        for name, size in sizes.most_common(limit):
+            click.echo(f"  {name:<{width}}{size:>11}")
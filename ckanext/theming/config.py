@@ -1,7 +1,17 @@
+import os
+import tempfile
+
 import ckan.plugins.toolkit as tk
 
 THEME = "ckan.ui.theme"
 ENABLE_VIEWS = "ckan.ui.enable_theming_views"
+PROFILE_COMPONENTS = "ckan.ui.profile_components"
+SERVER_TIMING = "ckan.ui.server_timing"
+SERVER_TIMING_COMPONENTS = "ckan.ui.server_timing.components"
+SLOW_RENDER_MS = "ckan.ui.slow_render_ms"
+SLOW_RENDER_COMPONENTS = "ckan.ui.slow_render_components"
+TEMPLATE_INDEX = "ckan.ui.template_index"
+WEIGHT_BUDGET = "ckan.ui.weight_budget"
 
 
 def theme() -> str:
@@ -19,3 +29,44 @@ def theme() -> str:
 def enable_views() -> bool:
     """Returns True if the theming views are enabled, False otherwise."""
     return tk.asbool(tk.config.get(ENABLE_VIEWS))
+
+
+def profile_components() -> bool:
+    """Returns True if UI components must record their render time, False otherwise.
+
+    Profiling is enabled implicitly by features that report component timings.
+    """
+    return tk.asbool(tk.config.get(PROFILE_COMPONENTS)) or server_timing() or bool(slow_render_ms())
+
+
+def server_timing() -> bool:
+    """Returns True if responses must include Server-Timing header, False otherwise."""
+    return tk.asbool(tk.config.get(SERVER_TIMING))
+
+
+def server_timing_components() -> int:
+    """Returns the number of the slowest components reported via Server-Timing header."""
+    return tk.asint(tk.config.get(SERVER_TIMING_COMPONENTS))
+
+
+def slow_render_ms() -> int:
+    """Returns the render time in milliseconds after which template render is logged, or 0 if disabled."""
+    return tk.asint(tk.config.get(SLOW_RENDER_MS))
+
+
+def slow_render_components() -> int:
+    """Returns the number of the slowest components included into the log of slow render."""
+    return tk.asint(tk.config.get(SLOW_RENDER_COMPONENTS))
+
+
+def template_index() -> str:
+    """Returns the path to the file with cached analysis of template sources."""
+    if path := tk.config.get(TEMPLATE_INDEX):
+        return path
+
+    return os.path.join(tk.config.get("ckan.cache_dir") or tempfile.gettempdir(), "theming", "templates.json")
+
+
+def weight_budget() -> str | None:
+    """Returns the path to the file with page size limits of endpoints, or None if not configured."""
+    return tk.config.get(WEIGHT_BUDGET) or None
@@ -0,0 +1,152 @@
+"""Render fixtures captured from Flask endpoints.
+
+A fixture contains the name of the template rendered by the endpoint together
+with context variables passed to it. Fixtures are produced by `ckan theme
+endpoint dump --fixtures DIR` and allow rendering of templates without
+database and search index.
+
+Example usage::
+
+    from ckanext.theming import fixtures
+
+    for fixture in fixtures.iter_fixtures("fixtures"):
+        with fixtures.request_context(app, fixture):
+            html = fixtures.render(fixture, helpers={"get_site_statistics": lambda: {}})
+"""
+
+import contextlib
+import os
+from collections.abc import Callable, Collection, Iterator, Mapping
+from typing import Any
+
+import msgspec
+from flask import Flask, render_template
+from flask.ctx import RequestContext
+from markupsafe import Markup
+
+import ckan.plugins.toolkit as tk
+
+from . import profiling
+
+
+class RenderFixture(msgspec.Struct):
+    """Template and context variables used by the endpoint.
+
+    :param endpoint: Name of the Flask endpoint.
+    :param params: URL parameters of the endpoint.
+    :param template: Name of the rendered template.
+    :param context: Context variables that can be serialized.
+    :param skipped: Names of context variables that cannot be serialized,
+        e.g. model objects or collections with markup. They are undefined
+        during the render.
+    :param markup: Names of context variables that contain safe markup.
+        They are not escaped during the render.
+    """
+
+    endpoint: str
+    params: dict[str, Any]
+    template: str
+    context: dict[str, Any] = msgspec.field(default_factory=dict)
+    skipped: list[str] = msgspec.field(default_factory=list)
+    markup: list[str] = msgspec.field(default_factory=list)
+
+
+def _contains_markup(value: Any) -> bool:
+    """Check if the collection contains safe markup."""
+    if isinstance(value, Markup):
+        return True
+
+    if isinstance(value, Mapping):
+        return any(map(_contains_markup, value.values()))  # pyright: ignore[reportUnknownArgumentType]
+
+    if isinstance(value, (list, tuple, set)):
+        return any(map(_contains_markup, value))  # pyright: ignore[reportUnknownArgumentType]
+
+    return False
+
+
+def capture(
+    endpoint: str,
+    params: dict[str, Any],
+    template: str,
+    context: Mapping[str, Any],
+    ignore: Collection[str] = (),
+) -> RenderFixture:
+    """Convert context variables of the render into a fixture."""
+    fixture = RenderFixture(endpoint, params, template)
+    for key, value in context.items():
+        if key in ignore:
+            continue
+
+        if isinstance(value, Markup):
+            fixture.context[key] = str(value)
+            fixture.markup.append(key)
+            continue
+
+        # markup turns into plain string and would be escaped during render
+        if _contains_markup(value):
+            fixture.skipped.append(key)
+            continue
+
+        try:
+            fixture.context[key] = msgspec.to_builtins(value)
+        except (TypeError, ValueError):
+            fixture.skipped.append(key)
+
+    return fixture
+
+
+def fixture_path(directory: str, endpoint: str) -> str:
+    """Get path to the fixture of the endpoint."""
+    return os.path.join(directory, f"{endpoint}.json")
+
+
+def save(fixture: RenderFixture, directory: str) -> str:
+    """Write the fixture into directory.
+
+    :return: path to the fixture
+    """
+    os.makedirs(directory, exist_ok=True)
+    filename = fixture_path(directory, fixture.endpoint)
+    with open(filename, "wb") as dest:
+        dest.write(msgspec.json.format(msgspec.json.encode(fixture)))
+    return filename
+
+
+def load(filename: str) -> RenderFixture:
+    """Read the fixture from file."""
+    with open(filename, "rb") as src:
+        return msgspec.json.decode(src.read(), type=RenderFixture)
+
+
+def iter_fixtures(directory: str) -> Iterator[RenderFixture]:
+    """Read every fixture from directory, ordered by endpoint."""
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            yield load(os.path.join(directory, name))
+
+
+def request_context(app: Flask, fixture: RenderFixture) -> RequestContext:
+    """Create request context for the URL of the fixture endpoint."""
+    with app.test_request_context():
+        url = tk.url_for(fixture.endpoint, **fixture.params)
+    return app.test_request_context(url)
+
+
+def render(fixture: RenderFixture, helpers: Mapping[str, Callable[..., Any]] | None = None, **extra: Any) -> str:
+    """Render the template of the fixture with its context variables.
+
+    Must be called inside the request context of the fixture endpoint,
+    created by `request_context`, because templates depend on the current
+    request. Template helpers that query database or search index can be
+    replaced by `helpers`. Extra keyword arguments override context variables
+    of the fixture.
+    """
+    # values were captured as safe markup produced by the endpoint
+    context = {
+        key: Markup(value) if key in fixture.markup else value  # noqa: S704
+        for key, value in fixture.context.items()
+    }
+    stubs = helpers or {}
+    with profiling.wrap_helpers(stubs.get) if stubs else contextlib.nullcontext():
+        return render_template(fixture.template, **{**context, **extra})
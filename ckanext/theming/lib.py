@@ -14,6 +14,7 @@ Example usage::
     btn = ui.link("Click me!", href="https://ckan.org")
 """
 
+import contextlib
 import dataclasses
 import datetime
 import logging
@@ -31,7 +32,7 @@ else:
 
 
 from flask import current_app
-from jinja2 import Undefined
+from jinja2 import BaseLoader, ChoiceLoader, FileSystemLoader, Undefined
 from jinja2.runtime import Macro
 from markupsafe import Markup
 from werkzeug.local import LocalProxy
@@ -43,7 +44,7 @@ from ckan.exceptions import CkanConfigurationException
 from ckan.lib.helpers import helper_functions as h
 
 from . import config as cfg
-from . import reference
+from . import profiling, reference
 from .base import UI, BaseTheme, BaseUtil, PElement
 from .interfaces import ITheme
 
@@ -330,12 +331,14 @@ class MacroUI(UI):
     __sources: list[str]
     _base_sources: list[str] = ["macros/ui.html"]
     _inv: dict[str, PElement]
+    _instrumented: bool
 
     @override
     def __init__(self, app: types.CKANApp, theme: "Theme", util: Util):  # noqa: UP037 Forward Reference
         self.util = util
 
         self._inv = {}
+        self._instrumented = cfg.profile_components()
         if hasattr(app, "_wsgi_app"):
             app = cast(types.CKANApp, app._wsgi_app)  # pyright: ignore[reportAttributeAccessIssue]
 
@@ -374,9 +377,15 @@ class MacroUI(UI):
     def _add_component(self, name: str, component: PElement):
         """Add a new component to the UI inventory.
 
+        If components profiling is enabled, the component is wrapped to
+        record its render time.
+
         :param name: The name of the component.
         :param component: A callable that produces the component.
         """
+        if self._instrumented:
+            component = profiling.instrument(name, component)
+
         self._inv[name] = component
 
     def __getattr__(self, name: str):
@@ -593,3 +602,68 @@ class UIManager:
 
 
 ui = LocalProxy(UIManager.get)
+
+
+def iter_loaders(loader: BaseLoader | None) -> Iterator[BaseLoader]:
+    """Iterate over the loader and all loaders nested into it."""
+    if loader is None:
+        return
+
+    yield loader
+    if isinstance(loader, ChoiceLoader):
+        for item in loader.loaders:
+            yield from iter_loaders(item)
+
+
+@contextlib.contextmanager
+def use_theme(app: types.CKANApp, theme: BaseTheme):
+    """Temporarily render templates and components of another theme.
+
+    Template directories of all registered themes are removed from the search
+    path of the application and then directories of the specified theme and
+    its parents are added back by `enable_theme`.
+
+    `enable_theme` also registers public directories and asset bundles of the
+    theme. Public directories are only added to `extra_public_paths`, which is
+    restored on exit, while the running application keeps serving its
+    original static files. Asset bundles cannot be unregistered from
+    webassets and stay registered under `theming/<theme name>`. Only
+    templates of that theme refer to this name, so bundles of one theme never
+    affect pages of other themes used by the same process.
+
+    Example usage::
+
+        with use_theme(app, get_theme("bare")):
+            ui = get_theme("bare").build_ui(app)
+    """
+    theme_paths = {os.path.realpath(path) for info in _themes.values() if (path := info.template_path())}
+    config_keys = [cfg.THEME, "extra_template_paths", "extra_public_paths"]
+    original = {key: tk.config.get(key) for key in config_keys}
+    old_extra = [path for path in (original["extra_template_paths"] or "").split(",") if path]
+
+    tk.config["extra_template_paths"] = ",".join(
+        path for path in old_extra if os.path.realpath(path) not in theme_paths
+    )
+    tk.config[cfg.THEME] = theme.name
+    enable_theme(theme, tk.config)
+    new_extra = [path for path in tk.config["extra_template_paths"].split(",") if path]
+
+    loaders = [loader for loader in iter_loaders(app.jinja_loader) if isinstance(loader, FileSystemLoader)]
+    searchpaths = [loader.searchpath for loader in loaders]
+    for loader in loaders:
+        loader.searchpath = new_extra + [path for path in loader.searchpath if path not in old_extra]
+
+    app.jinja_env.cache.clear()  # pyright: ignore[reportOptionalMemberAccess]
+    UIManager.set(theme.name, app)
+    try:
+        yield
+    finally:
+        for loader, searchpath in zip(loaders, searchpaths, strict=True):
+            loader.searchpath = searchpath
+        for key, value in original.items():
+            if value is None:
+                tk.config.pop(key, None)
+            else:
+                tk.config[key] = value
+        app.jinja_env.cache.clear()  # pyright: ignore[reportOptionalMemberAccess]
+        UIManager.reset()
@@ -7,7 +7,7 @@ if sys.version_info >= (3, 12):
 else:
     from typing_extensions import override
 
-from flask import Blueprint
+from flask import Blueprint, Response
 from jinja2 import pass_context
 from jinja2.runtime import Context
 
@@ -17,7 +17,7 @@ from ckan import types
 from ckan.common import CKANConfig
 
 from . import config as cfg
-from . import lib, views
+from . import lib, profiling, views
 from .interfaces import ITheme
 from .themes import make_bare_theme, make_classic_polyfill, make_mb_polyfill
 
@@ -59,9 +59,28 @@ class ThemingMixin(ITheme, p.IConfigurer, p.IMiddleware):
             app.jinja_env.globals.update({"ui": cast(Any, lib.ui)})
         else:
             log.warning("Cannot initialize UI in the non-flask application")
+            return app
+
+        if cfg.server_timing() or cfg.slow_render_ms():
+            profiling.track_renders(app)
+
+        if cfg.server_timing():
+            app.after_request(_add_server_timing)
+
         return app
 
 
+def _add_server_timing(response: Response) -> Response:
+    """Report render time of templates and components via Server-Timing header."""
+    if render := profiling.get_render_collector():
+        components = profiling.pop_collector()
+        response.headers.add(
+            "Server-Timing", profiling.server_timing(render, components, cfg.server_timing_components())
+        )
+
+    return response
+
+
 def _is_main_implementation(self: ThemingMixin, config: CKANConfig):
     """Check if the current plugin instance is the main implementation of ThemingMixin.
 
@@ -71,11 +90,25 @@ def _is_main_implementation(self: ThemingMixin, config: CKANConfig):
     if p.plugin_loaded("theming"):
         return self.name == "theming"
 
-    for name in reversed(config["ckan.plugins"]):
-        plugin = p.get_plugin(name)
-        if not isinstance(plugin, ThemingMixin):
-            continue
-        return plugin == self
+    return self.name == _elect_main_implementation(tuple(config["ckan.plugins"]))
+
+
+_main_implementations: dict[tuple[str, ...], str] = {}
+
+
+def _elect_main_implementation(plugins: tuple[str, ...]) -> str | None:
+    """Get the name of the last loaded plugin that extends ThemingMixin.
+
+    The result is computed once per set of enabled plugins and reused by
+    subsequent calls. Nothing is cached if no such plugin is loaded yet.
+    """
+    if plugins in _main_implementations:
+        return _main_implementations[plugins]
+
+    for name in reversed(plugins):
+        if isinstance(p.get_plugin(name), ThemingMixin):
+            _main_implementations[plugins] = name
+            return name
 
 
 @tk.blanket.cli
@@ -0,0 +1,1156 @@
+"""Measurement primitives for profiling and benchmarking of theme renders.
+
+Durations are collected as integer nanoseconds, produced by
+:py:func:`time.perf_counter_ns`, and summarized in milliseconds.
+
+Example usage::
+
+    from ckanext.theming import profiling
+    series = profiling.Series.from_samples([1_200_000, 1_350_000, 980_000])
+    print(series.summary.p95)
+"""
+
+import contextlib
+import fnmatch
+import functools
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import Any
+
+if sys.version_info >= (3, 12):
+    from typing import override
+else:
+    from typing_extensions import override
+
+import msgspec
+import sqlalchemy as sa
+from flask import has_app_context, has_request_context, signals
+from jinja2 import Environment, Template
+
+import ckan.plugins.toolkit as tk
+from ckan import types
+from ckan.lib.helpers import helper_functions
+
+from . import analysis
+from . import config as cfg
+
+log = logging.getLogger(__name__)
+
+NS_IN_MS = 1_000_000
+
+COLLECTOR_KEY = "ui_component_collector"
+RENDER_COLLECTOR_KEY = "ui_render_collector"
+# minimal number of executions of the same statement per render, that
+# indicates a query inside a loop
+N_PLUS_ONE_THRESHOLD = 5
+# growth rate of the render time relative to the input size, that indicates
+# nested loops over the input. 1 means linear growth, 2 - quadratic
+SUPERLINEAR_EXPONENT = 1.5
+
+
+def percentile(ordered: Sequence[float], pct: float) -> float:
+    """Compute percentile of sorted values using linear interpolation.
+
+    :param ordered: Values sorted in ascending order.
+    :param pct: Percentile in range [0, 100].
+    :return: The interpolated percentile, or 0 for empty sequence.
+    """
+    if not ordered:
+        return 0
+
+    position = (len(ordered) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return ordered[lower]
+
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Summary(msgspec.Struct):
+    """Descriptive statistics of a series of durations, in milliseconds."""
+
+    count: int
+    min: float
+    max: float
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    stddev: float
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[int]) -> "Summary":  # noqa: UP037 Forward Reference
+        """Summarize durations measured in nanoseconds."""
+        values = sorted(value / NS_IN_MS for value in samples)
+        count = len(values)
+        mean = sum(values) / count if count else 0
+        variance = sum((value - mean) ** 2 for value in values) / (count - 1) if count > 1 else 0
+
+        return cls(
+            count=count,
+            min=values[0] if values else 0,
+            max=values[-1] if values else 0,
+            mean=mean,
+            p50=percentile(values, 50),
+            p95=percentile(values, 95),
+            p99=percentile(values, 99),
+            stddev=math.sqrt(variance),
+        )
+
+
+class Series(msgspec.Struct):
+    """Raw durations in nanoseconds accompanied by their summary."""
+
+    samples: list[int]
+    summary: Summary
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[int]) -> "Series":  # noqa: UP037 Forward Reference
+        return cls(list(samples), Summary.from_samples(samples))
+
+
+def mann_whitney_u(first: Sequence[float], second: Sequence[float]) -> float:
+    """Test whether two samples come from the same distribution.
+
+    Two-sided Mann-Whitney U test with tie correction, based on normal
+    approximation. It does not assume normal distribution of durations, which
+    are usually skewed by GC pauses and caches.
+
+    :return: p-value of the test. Small value(e.g, below 0.05) means that
+        distributions are different.
+    """
+    n1 = len(first)
+    n2 = len(second)
+    if not n1 or not n2:
+        return 1
+
+    combined = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    ranks = [0.0] * len(combined)
+    ties = 0.0
+    idx = 0
+    while idx < len(combined):
+        end = idx
+        while end + 1 < len(combined) and combined[end + 1][0] == combined[idx][0]:
+            end += 1
+
+        size = end - idx + 1
+        ties += size**3 - size
+        for pos in range(idx, end + 1):
+            ranks[pos] = (idx + end) / 2 + 1
+
+        idx = end + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined, strict=True) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    total = n1 + n2
+    variance = n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return 1
+
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return min(math.erfc(max(z, 0) / math.sqrt(2)), 1)
+
+
+class Comparison(msgspec.Struct):
+    """Difference between baseline and current measurements.
+
+    :param baseline: Summary of baseline durations.
+    :param current: Summary of current durations.
+    :param delta: Relative change of the median, in percents.
+    :param p_value: p-value of the Mann-Whitney U test for the change.
+    """
+
+    baseline: Summary
+    current: Summary
+    delta: float
+    p_value: float
+
+    def is_significant(self, alpha: float = 0.05) -> bool:
+        return self.p_value < alpha
+
+    @classmethod
+    def from_series(cls, baseline: Series, current: Series) -> "Comparison":  # noqa: UP037 Forward Reference
+        old = baseline.summary.p50
+        delta = (current.summary.p50 - old) / old * 100 if old else 0
+        return cls(
+            baseline.summary,
+            current.summary,
+            delta,
+            mann_whitney_u(baseline.samples, current.samples),
+        )
+
+
+class ComponentStats(msgspec.Struct):
+    """Accumulated timings of a single UI component.
+
+    :param calls: Number of calls.
+    :param inclusive: Time spent inside the component, in nanoseconds.
+    :param exclusive: Time spent inside the component, excluding nested
+        components, in nanoseconds.
+    :param max_depth: Maximal nesting level of the component. Top-level
+        component calls have depth 0.
+    :param size: Bytes of markup produced by the component, excluding nested
+        components.
+    """
+
+    calls: int = 0
+    inclusive: int = 0
+    exclusive: int = 0
+    max_depth: int = 0
+    size: int = 0
+
+    def merge(self, other: "ComponentStats"):  # noqa: UP037 Forward Reference
+        self.calls += other.calls
+        self.inclusive += other.inclusive
+        self.exclusive += other.exclusive
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.size += other.size
+
+
+class ComponentCollector:
+    """Per-request storage of UI component timings.
+
+    Nested calls of the same component are included into inclusive time of
+    every level of nesting.
+    """
+
+    stats: dict[str, ComponentStats]
+    _children: list[int]
+    _children_size: list[int]
+
+    def __init__(self):
+        self.stats = defaultdict(ComponentStats)
+        self._children = []
+        self._children_size = []
+
+    def record(self, name: str, func: Callable[..., Any], args: Any, kwargs: Any) -> Any:
+        """Call the component and record its timings."""
+        depth = len(self._children)
+        self._children.append(0)
+        self._children_size.append(0)
+        result = None
+        start = time.perf_counter_ns()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            spent = time.perf_counter_ns() - start
+            size = len(result.encode()) if isinstance(result, str) else 0
+            children = self._children.pop()
+            children_size = self._children_size.pop()
+            if self._children:
+                self._children[-1] += spent
+                self._children_size[-1] += size
+
+            stats = self.stats[name]
+            stats.calls += 1
+            stats.inclusive += spent
+            stats.exclusive += spent - children
+            stats.max_depth = max(stats.max_depth, depth)
+            # output of nested component is not always included into the parent
+            stats.size += max(size - children_size, 0)
+
+        return result
+
+
+def get_collector() -> ComponentCollector | None:
+    """Get component collector of the current request.
+
+    :return: collector or None, if called outside of application context
+    """
+    if not has_app_context():
+        return None
+
+    collector = tk.g.get(COLLECTOR_KEY)
+    if collector is None:
+        collector = ComponentCollector()
+        setattr(tk.g, COLLECTOR_KEY, collector)
+
+    return collector
+
+
+def pop_collector() -> ComponentCollector | None:
+    """Remove component collector from the current request and return it."""
+    if not has_app_context():
+        return None
+
+    return tk.g.pop(COLLECTOR_KEY, None)
+
+
+def instrument(name: str, component: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap UI component to record its timings into the request's collector.
+
+    Attributes of the component, such as `arguments` of Jinja2 macro, are
+    available on the wrapper and the original component is accessible via
+    `__wrapped__`.
+    """
+
+    def wrapper(*args: Any, **kwargs: Any):
+        collector = get_collector()
+        if collector is None:
+            return component(*args, **kwargs)
+
+        return collector.record(name, component, args, kwargs)
+
+    return functools.update_wrapper(wrapper, component)
+
+
+class RenderCollector:
+    """Per-request storage of template render timings.
+
+    :param start: Moment when the request started, in nanoseconds.
+    :param templates: Time spent on rendering of every template.
+    :param rendered: Time spent on rendering of top-level templates. Nested
+        renders, e.g. snippets, are already included into it.
+    """
+
+    start: int
+    templates: dict[str, int]
+    rendered: int
+    _stack: list[int]
+
+    def __init__(self):
+        self.start = time.perf_counter_ns()
+        self.templates = defaultdict(int)
+        self.rendered = 0
+        self._stack = []
+
+    def start_render(self):
+        self._stack.append(time.perf_counter_ns())
+
+    def end_render(self, name: str) -> int:
+        """Record render time of the template and return it."""
+        if not self._stack:
+            return 0
+
+        spent = time.perf_counter_ns() - self._stack.pop()
+        self.templates[name] += spent
+        if not self._stack:
+            self.rendered += spent
+
+        return spent
+
+    def elapsed(self) -> int:
+        """Time passed since the beginning of the request."""
+        return time.perf_counter_ns() - self.start
+
+
+def get_render_collector() -> RenderCollector | None:
+    """Get render collector of the current request, if renders are tracked."""
+    if not has_app_context():
+        return None
+
+    return tk.g.get(RENDER_COLLECTOR_KEY)
+
+
+def _start_request():
+    setattr(tk.g, RENDER_COLLECTOR_KEY, RenderCollector())
+
+
+def _start_render(sender: Any, template: Template, **extra: Any):  # pyright: ignore[reportUnusedParameter]
+    if collector := get_render_collector():
+        collector.start_render()
+
+
+def _end_render(sender: Any, template: Template, **extra: Any):  # pyright: ignore[reportUnusedParameter]
+    if collector := get_render_collector():
+        spent = collector.end_render(template.name or "")
+        threshold = cfg.slow_render_ms()
+        if threshold and spent > threshold * NS_IN_MS:
+            _log_slow_render(template, spent)
+
+
+class SlowRender(msgspec.Struct):
+    """Details of the template render that took more time than expected.
+
+    :param endpoint: Name of the Flask endpoint.
+    :param template: Name of the template.
+    :param hierarchy: Filenames of templates extended by the template.
+    :param duration: Render time in nanoseconds.
+    :param components: The slowest components rendered during the request.
+    """
+
+    endpoint: str | None
+    template: str
+    hierarchy: list[str]
+    duration: int
+    components: dict[str, ComponentStats]
+
+
+def _log_slow_render(template: Template, spent: int):
+    hierarchy: list[str] = []
+    if template.filename:
+        try:
+            analysis.discover_template_hierarchy(template.environment, template, hierarchy)
+        except OSError:
+            log.debug("Cannot discover hierarchy of %s", template.name)
+
+    components: dict[str, ComponentStats] = {}
+    if collector := get_collector():
+        ranked = sorted(collector.stats.items(), key=lambda item: item[1].exclusive, reverse=True)
+        components.update(ranked[: cfg.slow_render_components()])
+
+    record = SlowRender(
+        endpoint=tk.request.endpoint if has_request_context() else None,
+        template=template.name or "",
+        hierarchy=hierarchy,
+        duration=spent,
+        components=components,
+    )
+    log.warning(
+        "Slow render of %s: %.3fms %s",
+        record.template,
+        spent / NS_IN_MS,
+        msgspec.json.encode(record).decode(),
+        extra={"slow_render": record},
+    )
+
+
+def track_renders(app: types.CKANApp):
+    """Record render time of templates during every request of the application.
+
+    Timings are available via :py:func:`get_render_collector`.
+    """
+    app.before_request(_start_request)
+    signals.before_render_template.connect(_start_render, app)
+    signals.template_rendered.connect(_end_render, app)
+
+
+def server_timing(render: RenderCollector, components: ComponentCollector | None, limit: int) -> str:
+    """Build value of Server-Timing header.
+
+    :param render: Template timings of the request.
+    :param components: Component timings of the request.
+    :param limit: Number of components with the highest exclusive time to include.
+    """
+    total = render.elapsed()
+    metrics = [
+        f"total;dur={total / NS_IN_MS:.3f}",
+        f'dispatch;desc="Without template rendering";dur={(total - render.rendered) / NS_IN_MS:.3f}',
+    ]
+    metrics.extend(
+        f'tpl-{idx};desc="{name}";dur={spent / NS_IN_MS:.3f}'
+        for idx, (name, spent) in enumerate(render.templates.items())
+    )
+
+    if components:
+        ranked = sorted(components.stats.items(), key=lambda item: item[1].exclusive, reverse=True)
+        metrics.extend(
+            f'ui-{name};desc="ui.{name} x{stats.calls}";dur={stats.exclusive / NS_IN_MS:.3f}'
+            for name, stats in ranked[:limit]
+        )
+
+    return ", ".join(metrics)
+
+
+class Tracer:
+    """Recorder of spans in Chrome trace event format.
+
+    The result can be opened in Perfetto UI or in `chrome://tracing`.
+    """
+
+    events: list[dict[str, Any]]
+    _origin: int
+
+    def __init__(self):
+        self.events = []
+        self._origin = time.perf_counter_ns()
+
+    def reset(self):
+        """Forget recorded spans and start the timeline from the current moment."""
+        self.events = []
+        self._origin = time.perf_counter_ns()
+
+    def add(self, name: str, category: str, start: int, end: int, **args: Any):
+        """Record a complete span between two moments measured in nanoseconds."""
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args: Any):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter_ns(), **args)
+
+    def wrap(self, name: str, category: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap function to record a span for every call."""
+
+        def wrapper(*args: Any, **kwargs: Any):
+            with self.span(name, category):
+                return func(*args, **kwargs)
+
+        return functools.update_wrapper(wrapper, func)
+
+    def wrap_generator(self, name: str, category: str, func: Callable[..., Iterator[Any]]) -> Callable[..., Any]:
+        """Wrap generator function to record a span from the call till exhaustion."""
+
+        def wrapper(*args: Any, **kwargs: Any):
+            with self.span(name, category):
+                yield from func(*args, **kwargs)
+
+        return functools.update_wrapper(wrapper, func)
+
+    def dump(self) -> bytes:
+        return msgspec.json.encode({"traceEvents": self.events, "displayTimeUnit": "ms"})
+
+
+class TracingCollector(ComponentCollector):
+    """Component collector that records a trace span for every component call."""
+
+    tracer: Tracer
+
+    def __init__(self, tracer: Tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    @override
+    def record(self, name: str, func: Callable[..., Any], args: Any, kwargs: Any) -> Any:
+        with self.tracer.span(f"ui.{name}", "component"):
+            return super().record(name, func, args, kwargs)
+
+
+@contextlib.contextmanager
+def wrap_templates(env: Environment, wrap: Callable[[Template, Callable[..., Any]], Callable[..., Any]]):
+    """Temporarily wrap render function of every template loaded by environment.
+
+    Render functions are wrapped when template is loaded, so the wrapper is
+    applied to top-level templates, as well as to extended, included and
+    imported templates. Original functions are restored on exit.
+    """
+    get_template = env.get_template
+    patched: dict[int, tuple[Template, Callable[..., Any]]] = {}
+
+    def loader(*args: Any, **kwargs: Any) -> Template:
+        tpl = get_template(*args, **kwargs)
+        if id(tpl) not in patched:
+            patched[id(tpl)] = (tpl, tpl.root_render_func)
+            tpl.root_render_func = wrap(tpl, tpl.root_render_func)
+        return tpl
+
+    env.get_template = loader
+    try:
+        yield
+    finally:
+        del env.get_template
+        for tpl, func in patched.values():
+            tpl.root_render_func = func
+
+
+@contextlib.contextmanager
+def wrap_helpers(wrap: Callable[[str, Callable[..., Any]], Callable[..., Any]]):
+    """Temporarily wrap every function from CKAN's helper registry."""
+    originals = dict(helper_functions)
+    helper_functions.update({name: wrap(name, func) for name, func in originals.items()})
+    try:
+        yield
+    finally:
+        helper_functions.update(originals)
+
+
+class AllocationSite(msgspec.Struct):
+    """Memory allocated by a single line of a template or a Python module."""
+
+    filename: str
+    lineno: int
+    size: int
+    count: int
+
+
+class MemoryRender(msgspec.Struct):
+    """Memory allocated during a render.
+
+    Sizes are in bytes. Allocated memory is the growth of traced memory that
+    survived the render, while peak is the maximal growth during the render.
+    """
+
+    template: str
+    allocated: int
+    peak: int
+    sites: list[AllocationSite]
+
+
+class MemoryTracker:
+    """Tracker of memory allocated by nested renders.
+
+    Allocations are attributed to the innermost template line from the
+    traceback. When traceback has no template frames, the innermost Python
+    line is used instead.
+    """
+
+    renders: dict[str, MemoryRender]
+    _stack: list[tuple[tracemalloc.Snapshot, int, int, list[int]]]
+
+    def __init__(self, env: Environment, nframe: int = 25, limit: int = 20):
+        self.renders = {}
+        self._stack = []
+        self._env = env
+        self._nframe = nframe
+        self._limit = limit
+
+    def __enter__(self):
+        tracemalloc.start(self._nframe)
+        return self
+
+    def __exit__(self, *exc: object):
+        tracemalloc.stop()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def _update_parent_peak(self, peak: int):
+        if self._stack:
+            self._stack[-1][3][0] = max(self._stack[-1][3][0], peak)
+
+    def start(self):
+        """Start tracking allocations of a render."""
+        current, peak = tracemalloc.get_traced_memory()
+        # peak is shared by all renders, so remember the parent's one before reset
+        self._update_parent_peak(peak)
+
+        snapshot = self._snapshot()
+        tracemalloc.reset_peak()
+        start, _peak = tracemalloc.get_traced_memory()
+        # the snapshot is alive until the end of the render, but belongs to
+        # neither the render nor its parents
+        self._stack.append((snapshot, start, start - current, [start]))
+
+    def stop(self, name: str) -> MemoryRender:
+        """Stop tracking allocations of the latest render.
+
+        When the same template is rendered multiple times, the render with
+        the highest peak is kept.
+
+        :param name: name of the rendered template
+        :return: allocations of the render
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        before, start, overhead, own_peak = self._stack.pop()
+        peak = max(own_peak[0], peak)
+        self._update_parent_peak(peak - overhead)
+
+        after = self._snapshot()
+        render = MemoryRender(
+            template=name,
+            allocated=current - start,
+            peak=peak - start,
+            sites=self.allocation_sites(before, after),
+        )
+        if name not in self.renders or self.renders[name].peak < render.peak:
+            self.renders[name] = render
+
+        # memory used by snapshots and their comparison does not belong to
+        # the parent, so its peak is measured again once they are released
+        del before, after
+        tracemalloc.reset_peak()
+        return render
+
+    def allocation_sites(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> list[AllocationSite]:
+        """Group memory allocated between snapshots by template lines."""
+        cache: Any = self._env.cache
+        templates: dict[str, Template] = {
+            tpl.filename: tpl for tpl in (cache.values() if cache is not None else []) if tpl.filename
+        }
+
+        sites: dict[tuple[str, int], AllocationSite] = {}
+        for diff in after.compare_to(before, "traceback"):
+            if diff.size_diff <= 0:
+                continue
+
+            frame = next((f for f in reversed(diff.traceback) if f.filename in templates), diff.traceback[-1])
+            if tpl := templates.get(frame.filename):
+                key = (tpl.name or frame.filename, tpl.get_corresponding_lineno(frame.lineno))
+            else:
+                key = (frame.filename, frame.lineno)
+
+            site = sites.setdefault(key, AllocationSite(filename=key[0], lineno=key[1], size=0, count=0))
+            site.size += diff.size_diff
+            site.count += max(diff.count_diff, 0)
+
+        return sorted(sites.values(), key=lambda site: site.size, reverse=True)[: self._limit]
+
+
+class QueryStats(msgspec.Struct):
+    """Accumulated SQL queries executed during renders of a single template.
+
+    :param renders: Number of renders.
+    :param count: Number of executed queries.
+    :param duration: Time spent on queries, in nanoseconds.
+    :param statements: Number of executions of every SQL statement.
+    """
+
+    renders: int = 0
+    count: int = 0
+    duration: int = 0
+    statements: dict[str, int] = msgspec.field(default_factory=dict)
+
+    def merge(self, other: "QueryStats"):  # noqa: UP037 Forward Reference
+        self.renders += other.renders
+        self.count += other.count
+        self.duration += other.duration
+        for statement, count in other.statements.items():
+            self.statements[statement] = self.statements.get(statement, 0) + count
+
+    def most_repeated(self, limit: int) -> list[tuple[str, int]]:
+        """Get statements with the highest number of executions."""
+        return sorted(self.statements.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def n_plus_one(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[str]:
+        """Get statements that are likely executed inside a loop.
+
+        :param threshold: minimal number of executions per render
+        :return: suspicious statements
+        """
+        renders = max(self.renders, 1)
+        return [statement for statement, count in self.statements.items() if count / renders >= threshold]
+
+
+class QueryCollector:
+    """Storage of SQL queries executed during template renders.
+
+    Queries are attributed to every template that is being rendered, so
+    parent templates include queries of nested snippets. Queries executed
+    outside of templates are attributed only to the request.
+    """
+
+    templates: dict[str, QueryStats]
+    _stack: list[str]
+    _starts: list[int]
+
+    def __init__(self, request: str):
+        self.request = request
+        self.templates = defaultdict(QueryStats)
+        self.templates[request].renders += 1
+        self._stack = []
+        self._starts = []
+
+    def start_render(self, name: str):
+        self._stack.append(name)
+        self.templates[name].renders += 1
+
+    def end_render(self):
+        self._stack.pop()
+
+    def before_execute(self, *args: Any):  # pyright: ignore[reportUnusedParameter]
+        self._starts.append(time.perf_counter_ns())
+
+    def after_execute(self, conn: Any, cursor: Any, statement: str, *args: Any):  # pyright: ignore[reportUnusedParameter]
+        spent = time.perf_counter_ns() - self._starts.pop()
+        statement = " ".join(statement.split())
+        # the same template can be rendered recursively
+        for name in {self.request, *self._stack}:
+            stats = self.templates[name]
+            stats.count += 1
+            stats.duration += spent
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+
+@contextlib.contextmanager
+def track_queries(engine: Any, collector: QueryCollector):
+    """Temporarily record SQL queries executed by engine into collector."""
+    sa.event.listen(engine, "before_cursor_execute", collector.before_execute)
+    sa.event.listen(engine, "after_cursor_execute", collector.after_execute)
+    try:
+        yield collector
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", collector.before_execute)
+        sa.event.remove(engine, "after_cursor_execute", collector.after_execute)
+
+
+class HelperStats(msgspec.Struct):
+    """Accumulated calls of a single template helper.
+
+    :param calls: Number of calls.
+    :param duration: Time spent inside the helper, including nested helpers,
+        in nanoseconds.
+    :param redundant: Number of calls with arguments that were already used
+        for the same helper during the request.
+    """
+
+    calls: int = 0
+    duration: int = 0
+    redundant: int = 0
+
+
+class HelperCollector:
+    """Storage of template helper calls made during template renders.
+
+    Calls are attributed to the innermost rendered template. Calls made
+    outside of templates are attributed to the request.
+    """
+
+    templates: dict[str, dict[str, HelperStats]]
+    _stack: list[str]
+    _seen: set[Any]
+
+    def __init__(self, request: str):
+        self.templates = defaultdict(lambda: defaultdict(HelperStats))
+        self._stack = [request]
+        self._seen = set()
+
+    def start_render(self, name: str):
+        self._stack.append(name)
+
+    def end_render(self):
+        self._stack.pop()
+
+    def wrap(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap helper to record its calls."""
+
+        def wrapper(*args: Any, **kwargs: Any):
+            stats = self.templates[self._stack[-1]][name]
+            stats.calls += 1
+            try:
+                key = (name, args, tuple(sorted(kwargs.items())))
+                if key in self._seen:
+                    stats.redundant += 1
+                else:
+                    self._seen.add(key)
+            except TypeError:
+                # unhashable arguments cannot be compared cheaply
+                pass
+
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.duration += time.perf_counter_ns() - start
+
+        return functools.update_wrapper(wrapper, func)
+
+
+class ComponentBenchmark(msgspec.Struct):
+    """Result of the repeated rendering of a single UI component.
+
+    :param component: Name of the component.
+    :param iterations: Number of renders.
+    :param duration: Time spent on all renders, in nanoseconds.
+    :param size: Length of the rendered markup.
+    :param error: Error produced by the component. Failed components are not
+        measured.
+    """
+
+    component: str
+    iterations: int = 0
+    duration: int = 0
+    size: int = 0
+    error: str | None = None
+
+    @property
+    def ops(self) -> float:
+        """Number of renders per second."""
+        return self.iterations / self.duration * 1_000_000_000 if self.duration else 0
+
+
+def benchmark_component(
+    name: str, component: Callable[..., Any], args: dict[str, Any], iterations: int
+) -> ComponentBenchmark:
+    """Render the component multiple times with the same arguments.
+
+    Must be called inside the request context.
+    """
+    try:
+        size = len(component(**args))
+    except Exception as err:  # noqa: BLE001
+        return ComponentBenchmark(name, error=f"{type(err).__name__}: {err}")
+
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        component(**args)
+
+    return ComponentBenchmark(name, iterations, time.perf_counter_ns() - start, size)
+
+
+class ComponentScaling(msgspec.Struct):
+    """Render speed of a single UI component with inputs of different size.
+
+    :param component: Name of the component.
+    :param sizes: Input size of every argument set.
+    :param results: Benchmark of every argument set.
+    """
+
+    component: str
+    sizes: dict[str, int] = msgspec.field(default_factory=dict)
+    results: dict[str, ComponentBenchmark] = msgspec.field(default_factory=dict)
+
+    @property
+    def exponent(self) -> float | None:
+        """Growth rate of the render time between two largest inputs.
+
+        Render time is expected to grow as `size ** exponent`. Time of the
+        render with empty input is treated as a fixed cost and excluded from
+        the comparison, unless it dominates the render. `None` is returned
+        when there are not enough measurements.
+        """
+        timings = {
+            self.sizes[label]: result.duration / result.iterations
+            for label, result in self.results.items()
+            if not result.error and result.duration
+        }
+        fixed = timings.pop(0, 0)
+        measured = sorted(timings.items())
+        if len(measured) < 2:  # noqa: PLR2004
+            return None
+
+        (small_size, small_time), (large_size, large_time) = measured[-2:]
+        # input that barely affects the render makes the difference too noisy
+        if small_time < fixed * 2 or large_time <= fixed:
+            fixed = 0
+
+        return math.log((large_time - fixed) / (small_time - fixed)) / math.log(large_size / small_size)
+
+    @property
+    def superlinear(self) -> bool:
+        """Render time grows faster than the input size."""
+        exponent = self.exponent
+        return exponent is not None and exponent >= SUPERLINEAR_EXPONENT
+
+
+def measure_scaling(
+    name: str,
+    component: Callable[..., Any],
+    arguments: dict[str, tuple[int, dict[str, Any]]],
+    iterations: int,
+) -> ComponentScaling:
+    """Benchmark the component with every set of arguments.
+
+    Arguments are mapped to the label of the set and contain the size of the
+    input together with the actual keyword arguments of the component.
+
+    Must be called inside the request context.
+    """
+    result = ComponentScaling(name)
+    for label, (size, args) in arguments.items():
+        result.sizes[label] = size
+        result.results[label] = benchmark_component(name, component, args, iterations)
+    return result
+
+
+class EndpointBenchmark(msgspec.Struct):
+    """Result of the repeated rendering of a single endpoint.
+
+    :param endpoint: Name of the Flask endpoint.
+    :param url: URL that was requested.
+    :param warmup: Number of requests made before measurements.
+    :param iterations: Number of measured requests.
+    :param total: Time spent on the whole request.
+    :param dispatch: Time spent on request outside of template rendering.
+    :param templates: Time spent on rendering of every template per request.
+    :param components: Timings of UI components accumulated over all
+        iterations. Available only when components are instrumented.
+    :param queries: SQL queries of the request and of every template
+        accumulated over all iterations. Available only when queries are
+        tracked.
+    :param size: Bytes in the body of the last response.
+    :param compressed: Bytes in the gzip-compressed body of the last response.
+    """
+
+    endpoint: str
+    url: str
+    warmup: int
+    iterations: int
+    total: Series
+    dispatch: Series
+    templates: dict[str, Series]
+    components: dict[str, ComponentStats] = msgspec.field(default_factory=dict)
+    queries: dict[str, QueryStats] = msgspec.field(default_factory=dict)
+    size: int = 0
+    compressed: int = 0
+
+    @property
+    def render_share(self) -> float:
+        """Median share of template rendering in the request time, in percents."""
+        total = self.total.summary.p50
+        return (total - self.dispatch.summary.p50) / total * 100 if total else 0
+
+    def all_series(self) -> dict[str, Series]:
+        """Get dispatch and template series in a single mapping."""
+        return {f"{self.endpoint}(without template rendering)": self.dispatch, **self.templates}
+
+    def compare(self, baseline: "EndpointBenchmark") -> dict[str, Comparison]:  # noqa: UP037 Forward Reference
+        """Compare series with the same name from this and baseline benchmarks."""
+        previous = baseline.all_series()
+        return {
+            name: Comparison.from_series(previous[name], series)
+            for name, series in self.all_series().items()
+            if name in previous
+        }
+
+
+def slowest_templates(results: Iterable[EndpointBenchmark]) -> list[tuple[str, float, EndpointBenchmark]]:
+    """Rank templates of all endpoints by median render time, the slowest first.
+
+    :return: triples of template name, median in milliseconds and benchmark
+        of the endpoint that rendered the template
+    """
+    templates = [(name, series.summary.p50, data) for data in results for name, series in data.templates.items()]
+    templates.sort(key=lambda item: item[1], reverse=True)
+    return templates
+
+
+def heaviest_components(results: Iterable[EndpointBenchmark]) -> Counter[str]:
+    """Sum bytes of markup produced by every component per request of all endpoints."""
+    sizes: Counter[str] = Counter()
+    for data in results:
+        for name, stats in data.components.items():
+            sizes[name] += stats.size // data.iterations
+    return sizes
+
+
+class WeightLimit(msgspec.Struct):
+    """Maximal size of the page, in bytes.
+
+    :param raw: Limit for the response body.
+    :param gzip: Limit for the gzip-compressed response body.
+    """
+
+    raw: int | None = None
+    gzip: int | None = None
+
+
+class WeightBudget(msgspec.Struct):
+    """Limits for size of pages produced by endpoints.
+
+    Example of the budget file::
+
+        default:
+          raw: 200000
+          gzip: 40000
+        endpoints:
+          dataset.*:
+            gzip: 60000
+          home.index:
+            raw: 100000
+
+    :param default: Limit applied to endpoints without own limit.
+    :param endpoints: Limits of endpoints, keyed by glob pattern. The first
+        matching pattern is used.
+    """
+
+    default: WeightLimit = msgspec.field(default_factory=WeightLimit)
+    endpoints: dict[str, WeightLimit] = msgspec.field(default_factory=dict)
+
+    @classmethod
+    def load(cls, filename: str) -> "WeightBudget":  # noqa: UP037 Forward Reference
+        """Read the budget from YAML or JSON file."""
+        with open(filename, "rb") as src:
+            return msgspec.yaml.decode(src.read(), type=cls)
+
+    def limit(self, endpoint: str) -> WeightLimit:
+        """Get limit of the endpoint."""
+        for pattern, limit in self.endpoints.items():
+            if fnmatch.fnmatch(endpoint, pattern):
+                return limit
+        return self.default
+
+    def check(self, benchmark: EndpointBenchmark) -> list[str]:
+        """Describe every limit exceeded by the endpoint."""
+        limit = self.limit(benchmark.endpoint)
+        violations: list[str] = []
+        if limit.raw is not None and benchmark.size > limit.raw:
+            violations.append(f"{benchmark.endpoint}: {benchmark.size} bytes exceed the limit of {limit.raw}")
+        if limit.gzip is not None and benchmark.compressed > limit.gzip:
+            violations.append(
+                f"{benchmark.endpoint}: {benchmark.compressed} gzip bytes exceed the limit of {limit.gzip}"
+            )
+        return violations
+
+
+class ThemeBenchmark(msgspec.Struct):
+    """Result of the endpoint benchmark under a specific theme.
+
+    :param theme: Name of the theme.
+    :param benchmark: Timings of the endpoint and size of the produced HTML.
+    """
+
+    theme: str
+    benchmark: EndpointBenchmark
+
+    def medians(self) -> dict[str, float]:
+        """Get median time of the whole request, of dispatch and of every template, in milliseconds."""
+        series = {f"{self.benchmark.endpoint}(total)": self.benchmark.total, **self.benchmark.all_series()}
+        return {name: item.summary.p50 for name, item in series.items()}
+
+
+class LoadTestWorker(msgspec.Struct):
+    """Requests sent by a single process of the load test.
+
+    :param latencies: Durations of successful requests in nanoseconds.
+    :param errors: Number of failed requests.
+    :param started: Monotonic time of the first request in nanoseconds.
+    :param finished: Monotonic time after the last request in nanoseconds.
+    """
+
+    latencies: list[int]
+    errors: int
+    started: int
+    finished: int
+
+
+class LoadTest(msgspec.Struct):
+    """Result of the concurrent rendering of a single endpoint.
+
+    :param endpoint: Name of the Flask endpoint.
+    :param url: URL that was requested.
+    :param threads: Number of threads in every process.
+    :param processes: Number of processes.
+    :param duration: Time in seconds during which requests were sent.
+    :param errors: Number of failed requests.
+    :param latency: Durations of successful requests.
+    """
+
+    endpoint: str
+    url: str
+    threads: int
+    processes: int
+    duration: float
+    errors: int
+    latency: Series
+
+    @property
+    def throughput(self) -> float:
+        """Number of successful requests per second."""
+        return self.latency.summary.count / self.duration if self.duration else 0
+
+    @classmethod
+    def aggregate(
+        cls,
+        endpoint: str,
+        url: str,
+        threads: int,
+        workers: Sequence[LoadTestWorker],
+    ) -> "LoadTest":  # noqa: UP037 Forward Reference
+        """Combine results of all processes.
+
+        Duration covers the time when any process was sending requests, so
+        startup of processes does not reduce the throughput.
+        """
+        started = min((item.started for item in workers), default=0)
+        finished = max((item.finished for item in workers), default=0)
+        return cls(
+            endpoint=endpoint,
+            url=url,
+            threads=threads,
+            processes=len(workers),
+            duration=(finished - started) / 1_000_000_000,
+            errors=sum(item.errors for item in workers),
+            latency=Series.from_samples([value for item in workers for value in item.latencies]),
+        )
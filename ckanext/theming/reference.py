@@ -2,6 +2,7 @@
 
 import copy
 import dataclasses
+import datetime
 import enum
 import fnmatch
 import os
@@ -94,6 +95,44 @@ def make_params(endpoint: str, args: set[str], source: Source, defaults: Mapping
     return params
 
 
+# representative values of argument types used by component reference
+# typical length of generated collections
+DEFAULT_SAMPLE_SIZE = 3
+
+_samples: dict[str, Callable[[int], Any]] = {
+    "any": lambda size: "Lorem ipsum dolor sit amet",
+    "str": lambda size: "Lorem ipsum dolor sit amet",
+    "bool": lambda size: True,
+    "int": lambda size: max(size, 1),
+    "datetime": lambda size: datetime.datetime(2024, 1, 1, 12, 0),  # noqa: DTZ001
+    "callable": lambda size: lambda *args, **kwargs: "",  # pyright: ignore[reportUnknownLambdaType]
+    "dict": lambda size: {"id": "lorem-ipsum", "name": "lorem-ipsum", "title": "Lorem ipsum", "url": "/"},
+    "dict[str, str]": lambda size: {f"key-{idx}": f"Lorem ipsum {idx}" for idx in range(size)},
+    "list": lambda size: [f"Lorem {idx}" for idx in range(size)],
+    "list[str]": lambda size: [f"Lorem {idx}" for idx in range(size)],
+    "list[dict]": lambda size: [{"title": f"Lorem {idx}", "url": "/"} for idx in range(size)],
+    "list[tuple[str, str]]": lambda size: [(f"lorem-{idx}", f"Lorem {idx}") for idx in range(size)],
+}
+
+
+def make_arguments(component: Component, size: int = DEFAULT_SAMPLE_SIZE) -> dict[str, Any]:
+    """Generate representative arguments for the component.
+
+    Values are produced from argument types. The first alternative is used
+    for unions, e.g. `dict` for `dict|list`, and the first literal for
+    enumerations, e.g. `start` for `start|center|end`.
+
+    The `size` controls the number of items in generated collections and the
+    value of integers, so that the same component can be rendered with empty,
+    typical and large input.
+    """
+    args: dict[str, Any] = {}
+    for name, arg in component.arguments.items():
+        option = arg.type.split("|")[0].strip()
+        args[name] = _samples[option](size) if option in _samples else option
+    return args
+
+
 K = TypeVar("K", bound=Hashable)
 V = TypeVar("V", bound=Hashable)
 
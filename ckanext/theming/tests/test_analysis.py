@@ -0,0 +1,200 @@
+import os
+from pathlib import Path
+
+import pytest
+from jinja2 import DictLoader, Environment, FileSystemLoader
+
+from ckanext.theming import analysis
+
+
+@pytest.fixture
+def env():
+    return Environment(loader=DictLoader({}))
+
+
+@pytest.mark.unit
+def test_parse_template(env: Environment, tmp_path: Path):
+    """Components, includes, blocks and parent are extracted from the AST."""
+    source = """{% extends "page.html" %}
+    {% block content %}
+        {{ ui.link("x") }}{{ ui.util.call(ui.button) }}{{ ui["icon"]() }}{{ ui.link("y") }}
+        {% include ["snippet.html", "fallback.html"] %}
+    {% endblock %}"""
+    filename = tmp_path / "read.html"
+    filename.write_text(source)
+
+    info = analysis.parse_template(env, source, "read.html", str(filename))
+    assert info.extends == "page.html"
+    assert not info.ckan_extends
+    assert sorted(info.components) == ["button", "icon", "link", "link"]
+    assert info.includes == ["snippet.html", "fallback.html"]
+    assert info.blocks == ["content"]
+
+
+@pytest.mark.unit
+def test_index_reuses_unchanged_files(env: Environment, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Index parses the file again only when its content changes."""
+    parsed: list[str] = []
+    parse_template = analysis.parse_template
+
+    def counter(env: Environment, source: str, name: str | None, filename: str):
+        parsed.append(filename)
+        return parse_template(env, source, name, filename)
+
+    monkeypatch.setattr(analysis, "parse_template", counter)
+
+    filename = tmp_path / "page.html"
+    filename.write_text("{{ ui.link() }}")
+    cache = str(tmp_path / "index.json")
+
+    index = analysis.TemplateIndex(env, cache)
+    assert index.get(str(filename)).components == ["link"]
+    index.save()
+    assert parsed == [str(filename)]
+
+    index = analysis.TemplateIndex(env, cache)
+    assert index.get(str(filename)).components == ["link"]
+    os.utime(filename, (0, 0))
+    assert index.get(str(filename)).components == ["link"]
+    assert parsed == [str(filename)]
+
+    filename.write_text("{{ ui.button() }}")
+    os.utime(filename, (1, 1))
+    assert index.get(str(filename)).components == ["button"]
+    assert parsed == [str(filename)] * 2
+
+
+@pytest.mark.unit
+def test_hierarchy_graph(tmp_path: Path):
+    """Parents are resolved once and shared by all children."""
+    files = {
+        "base.html": "{% block page %}{% endblock %}",
+        "page.html": '{% extends "base.html" %}{% block page %}{% include "snippet.html" %}{% endblock %}',
+        "read.html": '{% extends "page.html" %}',
+        "edit.html": '{% extends "page.html" %}',
+        "broken.html": '{% extends "missing.html" %}',
+        "snippet.html": "",
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+
+    env = Environment(loader=FileSystemLoader(str(tmp_path)))
+    graph = analysis.HierarchyGraph(env)
+
+    hierarchy, missing = graph.hierarchy_of(graph.locate("read.html"))
+    assert hierarchy == [str(tmp_path / "page.html"), str(tmp_path / "base.html")]
+    assert missing is None
+    assert len(env.cache) == 0  # pyright: ignore[reportArgumentType]
+    assert graph.hierarchy(env.get_template("read.html")) == (hierarchy, None)
+
+    parsed = len(graph.index.entries)
+    assert graph.hierarchy(env.get_template("edit.html"))[0] == hierarchy
+    assert len(graph.index.entries) == parsed + 1
+
+    assert graph.hierarchy(env.get_template("broken.html")) == ([], "missing.html")
+    assert (str(tmp_path / "page.html"), str(tmp_path / "snippet.html"), "include") in graph.edges(includes=True)
+
+
+@pytest.mark.unit
+def test_unchanged_since(tmp_path: Path):
+    """Template is unchanged only if neither it nor its parents were modified."""
+    files = {
+        "base.html": "{% block page %}{% endblock %}",
+        "read.html": '{% extends "base.html" %}',
+        "broken.html": '{% extends "missing.html" %}',
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+        os.utime(tmp_path / name, (100, 100))
+
+    graph = analysis.HierarchyGraph(Environment(loader=FileSystemLoader(str(tmp_path))))
+    assert graph.unchanged_since("read.html", 100)
+    assert not graph.unchanged_since("broken.html", 100)
+    assert not graph.unchanged_since("missing.html", 100)
+    assert not graph.unchanged_since(None, 100)
+
+    os.utime(tmp_path / "base.html", (200, 200))
+    assert not graph.unchanged_since("read.html", 100)
+
+
+@pytest.mark.unit
+def test_loops(env: Environment, tmp_path: Path):
+    """Components, helpers and macros inside loops are counted separately."""
+    source = """{% import "macros.html" as m %}
+    {% macro row(item) %}{{ item }}{% endmacro %}
+    {{ ui.heading() }}
+    {% for item in h.get_items() %}
+        {{ ui.link(item) }}{{ h.url_for(item) }}{{ row(item) }}{{ m.field(item) }}
+    {% endfor %}"""
+    filename = tmp_path / "list.html"
+    filename.write_text(source)
+
+    info = analysis.parse_template(env, source, "list.html", str(filename))
+    assert sorted(info.components) == ["heading", "link"]
+    assert info.loop_components == ["link"]
+    assert sorted(info.helpers) == ["get_items", "url_for"]
+    assert info.loop_helpers == ["url_for"]
+    assert info.loop_macros == 2
+
+    cost = analysis.estimate_cost("list.html", info, 1, {"link": 2})
+    iterations = analysis.LOOP_ITERATIONS
+    assert cost.cost == 1 + iterations * 2 + iterations * (2 * analysis.MACRO_COST + analysis.HELPER_COST) + 1
+
+
+@pytest.mark.unit
+def test_call_blocks_in_loops(env: Environment, tmp_path: Path):
+    """Call block inside a loop is counted either as a component or as a macro, but not as both."""
+    source = """{% macro row() %}{{ caller() }}{% endmacro %}
+    {% for item in items %}
+        {% call ui.panel(item) %}{{ ui.link(item) }}{% endcall %}
+        {% call row() %}{{ item }}{% endcall %}
+    {% endfor %}"""
+    filename = tmp_path / "list.html"
+    filename.write_text(source)
+
+    info = analysis.parse_template(env, source, "list.html", str(filename))
+    assert sorted(info.loop_components) == ["link", "panel"]
+    assert info.loop_macros == 1
+
+
+@pytest.mark.unit
+def test_compile_template(tmp_path: Path):
+    """Syntax errors and undefined imports are reported."""
+    files = {
+        "macros.html": "{% macro field() %}{% endmacro %}",
+        "good.html": '{% from "macros.html" import field %}{{ field() }}',
+        "bad-import.html": '{% from "macros.html" import missing %}{% import "nothing.html" as n %}',
+        "bad-syntax.html": "{% if %}",
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+
+    env = Environment(loader=FileSystemLoader(str(tmp_path)))
+    results = {name: analysis.compile_template(env, name, str(tmp_path / name)) for name in files}
+
+    assert not results["good.html"].failed
+    assert results["bad-import.html"].missing_imports == ["macros.html:missing", "nothing.html"]
+    assert results["bad-syntax.html"].error
+
+
+@pytest.mark.unit
+def test_compile_template_imports(tmp_path: Path):
+    """Inherited macros are found and syntax errors of imports are reported separately."""
+    files = {
+        "base-macros.html": "{% macro field() %}{% endmacro %}",
+        "macros.html": '{% extends "base-macros.html" %}{% macro select() %}{% endmacro %}',
+        "broken.html": "{% if %}",
+        "good.html": '{% from "macros.html" import field, select %}',
+        "bad-import.html": '{% import "broken.html" as b %}',
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(content)
+
+    env = Environment(loader=FileSystemLoader(str(tmp_path)))
+    results = {name: analysis.compile_template(env, name, str(tmp_path / name)) for name in files}
+
+    assert not results["good.html"].failed
+    assert not results["bad-import.html"].missing_imports
+    assert results["bad-import.html"].import_errors == [
+        "broken.html line 1: Expected an expression, got 'end of statement block'"
+    ]
@@ -0,0 +1,39 @@
+"""Render speed of UI components.
+
+The suite is excluded from the default run. Use `pytest -m benchmark` to
+execute it and `--benchmark-group-by=param:component` to compare themes
+component by component.
+"""
+
+import os
+from typing import Any
+
+import pytest
+
+from ckan import types
+
+from ckanext.theming import lib, reference
+
+THEMES = ["bare", "classic-polyfill", "midnight-blue-polyfill"]
+
+
+@pytest.mark.benchmark
+@pytest.mark.usefixtures("with_plugins", "with_request_context")
+@pytest.mark.parametrize("theme", THEMES)
+@pytest.mark.parametrize("component", sorted(reference.components))
+def test_component(benchmark: Any, app: types.CKANApp, theme: str, component: str):
+    """Component renders with arguments generated from the reference."""
+    info = lib.get_theme(theme)
+    with lib.use_theme(app.flask_app, info):
+        macros = app.flask_app.jinja_env.get_template("macros/ui.html")
+        assert os.path.realpath(macros.filename or "") == os.path.realpath(
+            os.path.join(info.template_path() or "", "macros", "ui.html")
+        )
+
+        ui = info.build_ui(app.flask_app)
+        func = getattr(ui, component, None)
+        if func is None:
+            pytest.skip(f"{theme} does not implement {component}")
+
+        args = reference.make_arguments(info.component_reference()[component])
+        benchmark(func, **args)
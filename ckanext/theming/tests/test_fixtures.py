@@ -0,0 +1,67 @@
+import datetime
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from jinja2 import DictLoader
+from markupsafe import Markup
+
+from ckan.lib.helpers import helper_functions
+
+from ckanext.theming import fixtures
+
+
+@pytest.fixture
+def flask_app():
+    app = Flask(__name__)
+    app.jinja_loader = DictLoader(
+        {
+            "page.html": "{{ pkg.title }} {{ h.site() }} {{ missing }}",
+            "request.html": "{{ request.path }} {{ notes }}",
+        }
+    )
+    app.jinja_env.globals["h"] = type("Helpers", (), {"__getattr__": lambda self, name: helper_functions[name]})()
+    app.add_url_rule("/dataset/<id>", "dataset.read")
+    return app
+
+
+@pytest.mark.unit
+def test_capture(tmp_path: Path):
+    """Serializable variables are saved, the rest is recorded as skipped."""
+    context = {
+        "pkg": {"title": "Dataset", "created": datetime.datetime(2024, 1, 1)},  # noqa: DTZ001
+        "missing": object(),
+        "request": "ignored",
+    }
+    fixture = fixtures.capture("dataset.read", {"id": "x"}, "page.html", context, ignore=["request"])
+    assert fixture.context == {"pkg": {"title": "Dataset", "created": "2024-01-01T00:00:00"}}
+    assert fixture.skipped == ["missing"]
+    assert fixture.markup == []
+
+    fixtures.save(fixture, str(tmp_path))
+    assert list(fixtures.iter_fixtures(str(tmp_path))) == [fixture]
+
+
+@pytest.mark.unit
+def test_render(flask_app: Flask, monkeypatch: pytest.MonkeyPatch):
+    """Template is rendered from the fixture with replaced helpers."""
+    monkeypatch.setitem(helper_functions, "site", lambda: "Real")
+    fixture = fixtures.RenderFixture("dataset.read", {}, "page.html", {"pkg": {"title": "Dataset"}})
+
+    with flask_app.test_request_context():
+        assert fixtures.render(fixture).strip() == "Dataset Real"
+        assert fixtures.render(fixture, helpers={"site": lambda: "Stub"}).strip() == "Dataset Stub"
+        assert fixtures.render(fixture, missing="Extra") == "Dataset Real Extra"
+
+
+@pytest.mark.unit
+def test_render_request(flask_app: Flask, tmp_path: Path):
+    """Fixture is rendered inside the request to its endpoint and keeps markup unescaped."""
+    context = {"notes": Markup("<b>Notes</b>"), "resources": [Markup("<i>CSV</i>")]}
+    fixture = fixtures.capture("dataset.read", {"id": "x"}, "request.html", context)
+    assert fixture.markup == ["notes"]
+    assert fixture.skipped == ["resources"]
+
+    fixture = fixtures.load(fixtures.save(fixture, str(tmp_path)))
+    with fixtures.request_context(flask_app, fixture):
+        assert fixtures.render(fixture) == "/dataset/x <b>Notes</b>"
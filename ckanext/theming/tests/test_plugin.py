@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+
+import pytest
+
+import ckan.plugins as p
+import ckan.plugins.toolkit as tk
+from ckan import types
+
+from ckanext.theming import plugin
+
+
+@pytest.fixture
+def without_theming(monkeypatch: pytest.MonkeyPatch, ckan_config: types.FixtureCkanConfig):
+    """Plugins that extend ThemingMixin, loaded without the theming plugin.
+
+    Returns the list of plugin names requested during election.
+    """
+    requested: list[str] = []
+    plugins: dict[str, Any] = {
+        "first": mock.Mock(spec=plugin.ThemingMixin),
+        "other": object(),
+        "second": mock.Mock(spec=plugin.ThemingMixin),
+    }
+
+    def get_plugin(name: str):
+        requested.append(name)
+        return plugins[name]
+
+    monkeypatch.setattr(plugin, "_main_implementations", {})
+    monkeypatch.setattr(p, "plugin_loaded", lambda name: name in plugins)
+    monkeypatch.setattr(p, "get_plugin", get_plugin)
+    monkeypatch.setitem(ckan_config, "ckan.plugins", list(plugins))
+    return requested
+
+
+@pytest.mark.unit
+def test_last_plugin_is_main_implementation(without_theming: list[str]):
+    """The last loaded plugin that extends ThemingMixin is the main implementation."""
+    first = SimpleNamespace(name="first")
+    second = SimpleNamespace(name="second")
+
+    assert plugin.ThemingMixin.get_default_theme_ui_sources(first) == []  # pyright: ignore[reportArgumentType]
+    assert plugin.ThemingMixin.get_default_theme_ui_sources(second) == [  # pyright: ignore[reportArgumentType]
+        "macros/theming_default_ui.html"
+    ]
+
+
+@pytest.mark.unit
+def test_main_implementation_is_elected_once(without_theming: list[str]):
+    """Repeated checks of the main implementation do not inspect plugins again."""
+    for name in ["first", "second", "first", "second"]:
+        plugin.ThemingMixin.get_default_theme_ui_sources(SimpleNamespace(name=name))  # pyright: ignore[reportArgumentType]
+
+    assert without_theming == ["second"]
+
+
+@pytest.mark.unit
+@pytest.mark.ckan_config("ckan.ui.server_timing", True)
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+def test_server_timing_header(app: types.FixtureApp):
+    """Responses report render time of templates and components."""
+    metrics = app.get(tk.url_for("home.index")).headers["Server-Timing"].split(", ")
+    names = [metric.split(";")[0] for metric in metrics]
+
+    assert names[:2] == ["total", "dispatch"]
+    assert "tpl-0" in names
+    assert any(name.startswith("ui-") for name in names)
+
+
+@pytest.mark.unit
+@pytest.mark.usefixtures("with_plugins", "clean_db")
+def test_server_timing_disabled(app: types.FixtureApp):
+    """Server-Timing header is not added by default."""
+    assert "Server-Timing" not in app.get(tk.url_for("home.index")).headers
@@ -0,0 +1,411 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import msgspec
+import pytest
+import sqlalchemy as sa
+from flask import Flask, render_template
+from jinja2 import DictLoader, Environment, Template
+
+from ckan import types
+from ckan.lib.helpers import helper_functions
+
+from ckanext.theming import profiling
+
+
+@pytest.mark.unit
+class TestSummary:
+    def test_empty(self):
+        """Summary of empty series contains zeros."""
+        summary = profiling.Summary.from_samples([])
+        assert summary.count == 0
+        assert summary.p99 == 0
+
+    def test_single(self):
+        """Single sample is used as every percentile."""
+        summary = profiling.Summary.from_samples([2_000_000])
+        assert summary.min == summary.p50 == summary.p99 == summary.max == 2
+        assert summary.stddev == 0
+
+    def test_percentiles(self):
+        """Percentiles are interpolated between samples."""
+        summary = profiling.Summary.from_samples([n * profiling.NS_IN_MS for n in range(1, 102)])
+        assert summary.min == 1
+        assert summary.p50 == 51
+        assert summary.p95 == 96
+        assert summary.p99 == 100
+        assert summary.max == 101
+        assert summary.mean == 51
+
+
+@pytest.mark.unit
+class TestMannWhitneyU:
+    def test_same(self):
+        """Identical samples are not different."""
+        assert profiling.mann_whitney_u([1, 2, 3, 4], [1, 2, 3, 4]) == 1
+
+    def test_shifted(self):
+        """Samples without overlap are different."""
+        assert profiling.mann_whitney_u(range(30), range(100, 130)) < 0.001
+
+    def test_empty(self):
+        """Empty sample never produces significant difference."""
+        assert profiling.mann_whitney_u([], [1, 2, 3]) == 1
+
+
+@pytest.mark.unit
+def test_component_collector():
+    """Collector separates time of nested components."""
+    collector = profiling.ComponentCollector()
+
+    def outer():
+        return collector.record("inner", lambda: "inner", (), {})
+
+    assert collector.record("outer", outer, (), {}) == "inner"
+    outer_stats = collector.stats["outer"]
+    inner_stats = collector.stats["inner"]
+    assert outer_stats.calls == inner_stats.calls == 1
+    assert outer_stats.max_depth == 0
+    assert inner_stats.max_depth == 1
+    assert outer_stats.exclusive == outer_stats.inclusive - inner_stats.inclusive
+
+
+@pytest.mark.unit
+def test_component_collector_size():
+    """Collector separates markup of nested components."""
+    collector = profiling.ComponentCollector()
+
+    def outer():
+        return "<p>" + collector.record("inner", lambda: "inner", (), {}) + "</p>"
+
+    assert collector.record("outer", outer, (), {}) == "<p>inner</p>"
+    assert collector.stats["inner"].size == len("inner")
+    assert collector.stats["outer"].size == len("<p></p>")
+
+
+@pytest.mark.unit
+def test_server_timing():
+    """Server-Timing header contains templates and the slowest components."""
+    render = profiling.RenderCollector()
+    render.templates.update({"page.html": 3 * profiling.NS_IN_MS, "snippet.html": profiling.NS_IN_MS})
+    render.rendered = 3 * profiling.NS_IN_MS
+
+    components = profiling.ComponentCollector()
+    components.stats["button"] = profiling.ComponentStats(calls=2, exclusive=profiling.NS_IN_MS)
+    components.stats["link"] = profiling.ComponentStats(calls=1, exclusive=2 * profiling.NS_IN_MS)
+
+    metrics = profiling.server_timing(render, components, 1).split(", ")
+    assert metrics[0].startswith("total;dur=")
+    assert metrics[2:] == [
+        'tpl-0;desc="page.html";dur=3.000',
+        'tpl-1;desc="snippet.html";dur=1.000',
+        'ui-link;desc="ui.link x1";dur=2.000',
+    ]
+
+
+@pytest.fixture
+def slow_app(tmp_path: Path) -> Flask:
+    """Application that renders a page with components of different speed."""
+    (tmp_path / "base.html").write_text("{% block content %}{% endblock %}")
+    (tmp_path / "page.html").write_text(
+        '{% extends "base.html" %}{% block content %}{{ a() }}{{ b() }}{{ c() }}{% endblock %}'
+    )
+
+    app = Flask(__name__, template_folder=str(tmp_path))
+    for name, delay in {"a": 30, "b": 10, "c": 1}.items():
+        app.jinja_env.globals[name] = profiling.instrument(name, lambda delay=delay: time.sleep(delay / 1000) or "")
+    app.add_url_rule("/page", "page", lambda: render_template("page.html"))
+    profiling.track_renders(app)  # pyright: ignore[reportArgumentType]
+    return app
+
+
+@pytest.mark.unit
+class TestSlowRender:
+    def test_slow(
+        self, slow_app: Flask, tmp_path: Path, ckan_config: types.FixtureCkanConfig, caplog: pytest.LogCaptureFixture
+    ):
+        """Render over the threshold is logged with endpoint, hierarchy and the slowest components."""
+        ckan_config["ckan.ui.slow_render_ms"] = 20
+        ckan_config["ckan.ui.slow_render_components"] = 2
+
+        with caplog.at_level(logging.WARNING, logger=profiling.log.name):
+            slow_app.test_client().get("/page")
+
+        [record] = caplog.records
+        details: profiling.SlowRender = record.slow_render  # pyright: ignore[reportAttributeAccessIssue]
+        assert details.endpoint == "page"
+        assert details.template == "page.html"
+        assert details.hierarchy == [os.path.normpath(tmp_path / "base.html")]
+        assert details.duration > 20 * profiling.NS_IN_MS
+        assert list(details.components) == ["a", "b"]
+
+    @pytest.mark.parametrize("threshold", [0, 1000])
+    def test_fast(
+        self, slow_app: Flask, threshold: int, ckan_config: types.FixtureCkanConfig, caplog: pytest.LogCaptureFixture
+    ):
+        """Render under the threshold or with disabled logging is not logged."""
+        ckan_config["ckan.ui.slow_render_ms"] = threshold
+        ckan_config["ckan.ui.slow_render_components"] = 2
+
+        with caplog.at_level(logging.WARNING, logger=profiling.log.name):
+            slow_app.test_client().get("/page")
+
+        assert not caplog.records
+
+
+@pytest.mark.unit
+def test_query_collector():
+    """Queries are attributed to every rendered template and repeated ones are flagged."""
+    engine = sa.create_engine("sqlite://")
+    collector = profiling.QueryCollector("dataset.search")
+
+    with profiling.track_queries(engine, collector), engine.connect() as conn:
+        conn.execute(sa.text("SELECT 1"))
+        collector.start_render("page.html")
+        for idx in range(profiling.N_PLUS_ONE_THRESHOLD):
+            collector.start_render("snippet.html")
+            conn.execute(sa.text("SELECT :idx"), {"idx": idx})
+            collector.end_render()
+        collector.end_render()
+
+    request = collector.templates["dataset.search"]
+    page = collector.templates["page.html"]
+    snippet = collector.templates["snippet.html"]
+    assert request.count == profiling.N_PLUS_ONE_THRESHOLD + 1
+    assert page.count == snippet.count == profiling.N_PLUS_ONE_THRESHOLD
+    assert snippet.renders == profiling.N_PLUS_ONE_THRESHOLD
+    assert page.n_plus_one() == ["SELECT ?"]
+    assert snippet.n_plus_one() == []
+
+
+@pytest.mark.unit
+def test_helper_collector():
+    """Helper calls are attributed to the innermost template and repeated calls are flagged."""
+    collector = profiling.HelperCollector("dataset.read")
+    url_for = collector.wrap("url_for", lambda *args, **kwargs: "/")
+    render = collector.wrap("render_datetime", lambda value: value)
+    assert url_for.__name__ == "<lambda>"
+
+    url_for("home.index")
+    collector.start_render("page.html")
+    url_for("home.index")
+    collector.start_render("snippet.html")
+    url_for("dataset.read", id="x")
+    url_for("dataset.read", id="x")
+    render(["unhashable"])
+    render(["unhashable"])
+    collector.end_render()
+    collector.end_render()
+
+    request = collector.templates["dataset.read"]["url_for"]
+    page = collector.templates["page.html"]["url_for"]
+    snippet = collector.templates["snippet.html"]
+    assert (request.calls, request.redundant) == (1, 0)
+    assert (page.calls, page.redundant) == (1, 1)
+    assert (snippet["url_for"].calls, snippet["url_for"].redundant) == (2, 1)
+    assert (snippet["render_datetime"].calls, snippet["render_datetime"].redundant) == (2, 0)
+
+
+@pytest.mark.unit
+class TestComponentScaling:
+    def _scaling(self, durations: dict[int, int]):
+        return profiling.ComponentScaling(
+            "test",
+            {str(size): size for size in durations},
+            {str(size): profiling.ComponentBenchmark("test", 1, duration) for size, duration in durations.items()},
+        )
+
+    def test_linear(self):
+        """Fixed costs do not affect growth between largest inputs."""
+        scaling = self._scaling({0: 5000, 3: 5300, 100: 15000, 1000: 105000})
+        assert scaling.exponent == pytest.approx(1, abs=0.1)
+        assert not scaling.superlinear
+
+    def test_quadratic(self):
+        """Nested loops over the input are detected."""
+        scaling = self._scaling({0: 5000, 3: 5900, 100: 15000, 1000: 1005000})
+        assert scaling.exponent == pytest.approx(2, abs=0.1)
+        assert scaling.superlinear
+
+    def test_failed(self):
+        """Growth is unknown without two successful measurements."""
+        scaling = self._scaling({0: 5000, 100: 15000})
+        scaling.results["100"] = profiling.ComponentBenchmark("test", error="TypeError")
+        assert scaling.exponent is None
+        assert not scaling.superlinear
+
+    def test_constant(self):
+        """Components that ignore the input are not flagged because of noise."""
+        scaling = self._scaling({0: 5000, 3: 5010, 100: 5020, 1000: 5200})
+        assert not scaling.superlinear
+
+
+@pytest.mark.unit
+class TestWeightBudget:
+    def _benchmark(self, endpoint: str, size: int, compressed: int):
+        series = profiling.Series.from_samples([1])
+        return profiling.EndpointBenchmark(endpoint, "/", 1, 1, series, series, {}, size=size, compressed=compressed)
+
+    def test_default(self):
+        """Default limit is used for endpoints without own limit."""
+        budget = profiling.WeightBudget(profiling.WeightLimit(raw=100, gzip=10))
+        assert budget.check(self._benchmark("home.index", 100, 10)) == []
+        assert len(budget.check(self._benchmark("home.index", 101, 11))) == 2
+
+    def test_patterns(self):
+        """The first matching pattern overrides the default limit."""
+        budget = profiling.WeightBudget(
+            profiling.WeightLimit(raw=100),
+            {"dataset.*": profiling.WeightLimit(gzip=10), "*": profiling.WeightLimit(raw=1)},
+        )
+        assert budget.check(self._benchmark("dataset.search", 1000, 10)) == []
+        assert budget.check(self._benchmark("group.index", 2, 0)) == ["group.index: 2 bytes exceed the limit of 1"]
+
+
+@pytest.mark.unit
+def test_load_test_aggregate():
+    """Results of processes are combined over the time when requests were sent."""
+    second = 1_000_000_000
+    workers = [
+        profiling.LoadTestWorker([profiling.NS_IN_MS] * 10, 1, started=5 * second, finished=7 * second),
+        profiling.LoadTestWorker([profiling.NS_IN_MS] * 30, 0, started=6 * second, finished=9 * second),
+    ]
+    result = profiling.LoadTest.aggregate("home.index", "/", 2, workers)
+    assert result.processes == 2
+    assert result.errors == 1
+    assert result.latency.summary.count == 40
+    assert result.duration == 4
+    assert result.throughput == 10
+
+
+@pytest.mark.unit
+def test_sweep_rankings():
+    """Templates and components of all endpoints are ranked together."""
+
+    def benchmark(endpoint: str, templates: dict[str, int], components: dict[str, int]):
+        series = profiling.Series.from_samples([profiling.NS_IN_MS])
+        return profiling.EndpointBenchmark(
+            endpoint,
+            "/",
+            1,
+            2,
+            series,
+            series,
+            {name: profiling.Series.from_samples([ms * profiling.NS_IN_MS]) for name, ms in templates.items()},
+            {name: profiling.ComponentStats(size=size) for name, size in components.items()},
+        )
+
+    results = [
+        benchmark("home.index", {"home.html": 2, "base.html": 1}, {"link": 100}),
+        benchmark("dataset.search", {"search.html": 3}, {"link": 50, "button": 20}),
+    ]
+
+    assert [(name, median) for name, median, _ in profiling.slowest_templates(results)] == [
+        ("search.html", 3),
+        ("home.html", 2),
+        ("base.html", 1),
+    ]
+    assert profiling.slowest_templates(results)[0][2].endpoint == "dataset.search"
+    assert profiling.heaviest_components(results).most_common() == [("link", 75), ("button", 10)]
+
+
+@pytest.mark.unit
+class TestTracer:
+    def _spans(self, tracer: profiling.Tracer):
+        return {event["name"]: (event["ts"], event["ts"] + event["dur"]) for event in tracer.events}
+
+    def test_nesting(self):
+        """Spans of nested components are enclosed by spans of their parents."""
+        tracer = profiling.Tracer()
+        collector = profiling.TracingCollector(tracer)
+
+        def outer():
+            return collector.record("inner", lambda: "inner", (), {})
+
+        assert collector.record("outer", outer, (), {}) == "inner"
+        spans = self._spans(tracer)
+        assert spans["ui.outer"][0] <= spans["ui.inner"][0] <= spans["ui.inner"][1] <= spans["ui.outer"][1]
+        assert collector.stats["inner"].calls == 1
+
+    def test_templates(self):
+        """Span of the template covers rendering of extended and included templates."""
+        env = Environment(
+            loader=DictLoader(
+                {
+                    "base.html": "<{% block main %}{% endblock %}>",
+                    "page.html": "{% extends 'base.html' %}{% block main %}{% include 'snippet.html' %}{% endblock %}",
+                    "snippet.html": "snippet",
+                }
+            )
+        )
+        tracer = profiling.Tracer()
+        original = env.get_template("page.html").root_render_func
+
+        def wrap(tpl: Template, func: Any):
+            return tracer.wrap_generator(tpl.name or "", "template", func)
+
+        with profiling.wrap_templates(env, wrap):
+            assert env.get_template("page.html").render() == "<snippet>"
+
+        spans = self._spans(tracer)
+        assert set(spans) == {"page.html", "base.html", "snippet.html"}
+        assert spans["page.html"][0] <= spans["snippet.html"][0] <= spans["snippet.html"][1] <= spans["page.html"][1]
+        assert env.get_template("page.html").root_render_func is original
+
+    def test_helpers(self, monkeypatch: pytest.MonkeyPatch):
+        """Helpers are traced while wrapped and restored afterwards."""
+        monkeypatch.setitem(helper_functions, "site_title", lambda: "CKAN")
+        tracer = profiling.Tracer()
+
+        with profiling.wrap_helpers(lambda name, func: tracer.wrap(f"h.{name}", "helper", func)):
+            assert helper_functions["site_title"]() == "CKAN"
+
+        assert [event["name"] for event in tracer.events] == ["h.site_title"]
+        assert helper_functions["site_title"].__name__ == "<lambda>"
+
+        tracer.reset()
+        assert tracer.events == []
+
+
+@pytest.mark.unit
+def test_memory_tracker():
+    """Peak of the parent includes peaks of nested renders, but not snapshots taken for them."""
+    tracker = profiling.MemoryTracker(Environment(), nframe=1)
+    with tracker:
+        tracker.start()
+        # many live objects make snapshots of nested renders large
+        kept = [bytes(100) for _ in range(50_000)]
+
+        tracker.start()
+        temporary = bytes(1_000_000)
+        del temporary
+        child = tracker.stop("snippet.html")
+
+        parent = tracker.stop("page.html")
+
+    assert kept
+    assert child.peak >= 1_000_000
+    assert child.allocated < 1_000_000
+    assert parent.allocated >= 50_000 * 100
+    assert parent.peak == pytest.approx(parent.allocated + child.peak, abs=100_000)
+    assert tracker.renders == {"snippet.html": child, "page.html": parent}
+
+
+@pytest.mark.unit
+def test_theme_benchmark_medians():
+    """Medians of the whole request, dispatch and templates are reported under one mapping."""
+    total = profiling.Series.from_samples([5 * profiling.NS_IN_MS])
+    dispatch = profiling.Series.from_samples([2 * profiling.NS_IN_MS])
+    templates = {"page.html": profiling.Series.from_samples([3 * profiling.NS_IN_MS])}
+    benchmark = profiling.EndpointBenchmark("home.index", "/", 1, 1, total, dispatch, templates)
+    result = profiling.ThemeBenchmark("bare", benchmark)
+
+    assert result.medians() == {
+        "home.index(total)": 5,
+        "home.index(without template rendering)": 2,
+        "page.html": 3,
+    }
+    assert msgspec.json.decode(msgspec.json.encode(result), type=profiling.ThemeBenchmark) == result
@@ -1,3 +1,6 @@
+import os
+import shutil
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Any
 
@@ -5,20 +8,159 @@ import pytest
 from flask_login import encode_cookie  # pyright: ignore[reportUnknownVariableType]
 from playwright.sync_api import BrowserContext, Page
 
-from ckan import types
+import ckan.plugins as p
+import ckan.plugins.toolkit as tk
+from ckan import model, types
+from ckan.cli import load_config
+from ckan.tests import factories
+
+from ckanext.theming.themes.bare.tests import sharding
+from ckanext.theming.themes.bare.tests.screenshots import ScreenshotManifest, page_digest
+from ckanext.theming.themes.bare.tests.snapshot import DatabaseSnapshot, SearchSnapshot
 
 _here = Path(__file__).parent
+_resources = sharding.WorkerResources()
 
 
-@pytest.fixture
-def clean_db(reset_db: Any, migrate_db_for: Any):
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: pytest.Config):
+    """Allocate resources of pytest-xdist worker before CKAN reads its config."""
+    global _resources  # noqa: PLW0603
+
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "")
+    if not worker:
+        return
+
+    original = load_config(config.getoption("ckan_ini"))
+    db_url = os.environ.get("CKAN_SQLALCHEMY_URL") or original["sqlalchemy.url"]
+    site_url = os.environ.get("CKAN_SITE_URL") or original["ckan.site_url"]
+    site_id = os.environ.get("CKAN_SITE_ID") or original.get("ckan.site_id") or "default"
+
+    _resources = sharding.allocate(worker, site_url, site_id, db_url)
+    sharding.export(_resources, db_url)
+
+
+@pytest.fixture(scope="session")
+def worker_resources() -> sharding.WorkerResources:
+    """Server, database schema and search site ID of the current pytest-xdist worker.
+
+    Usage:
+        def test_example(worker_resources):
+            snapshot = DatabaseSnapshot(engine, worker_resources.qualify("snapshot"))
+
+    When tests are not distributed, resources are empty and the original
+    configuration is used.
+    """
+    return _resources
+
+
+@pytest.fixture(scope="session")
+def worker_server(
+    worker_resources: sharding.WorkerResources,
+    request: pytest.FixtureRequest,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Iterator[None]:
+    """Start CKAN server for the current pytest-xdist worker.
+
+    The server is started by the first test that uses the browser, so tests
+    that do not open pages neither wait for it nor migrate the database.
+    Database schema of the worker is initialized before the start.
+    The server uses `CKAN_INI` config file, or the config file of tests, and
+    writes its output into `server.log` inside the worker's temporary
+    directory.
+    """
+    if not worker_resources.sharded:
+        yield
+        return
+
+    # schema of the worker is empty until it is migrated
+    request.getfixturevalue("db_snapshot")
+    ckan_ini = os.environ.get("CKAN_INI") or request.config.getoption("ckan_ini")
+    log = tmp_path_factory.mktemp("ckan") / "server.log"
+    with sharding.run_server(worker_resources, ckan_ini, str(log)):
+        yield
+
+
+@pytest.fixture(scope="session")
+def db_snapshot(
+    reset_db: Any, migrate_db_for: Any, worker_resources: sharding.WorkerResources
+) -> Iterator[DatabaseSnapshot]:
+    """Snapshot of the empty migrated database, taken once per session."""
     reset_db()
     migrate_db_for("activity")
+    snapshot = DatabaseSnapshot(model.meta.engine, worker_resources.qualify("theming_snapshot_empty"))
+    snapshot.take()
+    yield snapshot
+    snapshot.drop()
+
+
+@pytest.fixture
+def clean_db(db_snapshot: DatabaseSnapshot):
+    db_snapshot.restore()
+
+
+@pytest.fixture(scope="session")
+def seeded_snapshot(db_snapshot: DatabaseSnapshot, worker_resources: sharding.WorkerResources):
+    """Database and search index with entities for every page, created once per session.
+
+    :return: snapshots of the database and search index, and created entities
+    """
+    db_snapshot.restore()
+    plugins = [name for name in tk.aslist(tk.config.get("ckan.plugins")) if not p.plugin_loaded(name)]
+    for name in plugins:
+        p.load(name)
+
+    try:
+        search = SearchSnapshot()
+        with search.record():
+            page_size = tk.asint(tk.config.get("ckan.datasets_per_page"))
+            users = factories.User.create_batch(page_size + 1)
+            member = [{"name": users[0]["id"], "capacity": "member"}]
+            groups = factories.Group.create_batch(page_size + 1, users=member)
+            organizations = factories.Organization.create_batch(page_size + 1, users=member)
+            packages = factories.Dataset.create_batch(page_size + 1, owner_org=organizations[0]["id"])
+            resources = factories.Resource.create_batch(2, package_id=packages[0]["id"])
+            views = factories.ResourceView.create_batch(2, resource_id=resources[0]["id"])
+    finally:
+        for name in reversed(plugins):
+            p.unload(name)
+
+    snapshot = DatabaseSnapshot(model.meta.engine, worker_resources.qualify("theming_snapshot_seeded"))
+    snapshot.take()
+    data = {
+        "resource": resources[0],
+        "package": packages[0],
+        "resource_view": views[0],
+        "group": groups[0],
+        "organization": organizations[0],
+        "user": users[0],
+    }
+    yield snapshot, search, data
+    snapshot.drop()
+
+
+@pytest.fixture
+def seeded_db(seeded_snapshot: Any) -> dict[str, Any]:
+    """Restore the seeded database and search index.
+
+    Usage:
+        def test_example(seeded_db):
+            page.goto(f"/dataset/{seeded_db['package']['name']}")
+
+    :return: entities created by seeding, keyed by type
+    """
+    snapshot, search, data = seeded_snapshot
+    snapshot.restore()
+    search.restore()
+    return data
 
 
 @pytest.fixture
-def browser_context_args(browser_context_args: dict[str, Any], ckan_config: dict[str, Any]):
-    """Modify playwright's standard configuration of browser's context."""
+def browser_context_args(browser_context_args: dict[str, Any], ckan_config: dict[str, Any], worker_server: None):
+    """Modify playwright's standard configuration of browser's context.
+
+    Pages are requested from the server of the current pytest-xdist worker.
+    """
     browser_context_args["base_url"] = ckan_config["ckan.site_url"]
     return browser_context_args
 
@@ -86,8 +228,22 @@ def screenshots_dir():
     return _here / ".." / ".test-screenshots"
 
 
+@pytest.fixture(scope="session")
+def screenshot_manifests() -> Iterator[dict[Path, ScreenshotManifest]]:
+    """Manifests of screenshot directories, written at the end of the session."""
+    manifests: dict[Path, ScreenshotManifest] = {}
+    yield manifests
+    for manifest in manifests.values():
+        manifest.save()
+
+
 @pytest.fixture
-def screenshot(page: Page, request: pytest.FixtureRequest, screenshots_dir: Path):
+def screenshot(
+    page: Page,
+    request: pytest.FixtureRequest,
+    screenshots_dir: Path,
+    screenshot_manifests: dict[Path, ScreenshotManifest],
+):
     """Fixture to take screenshots during a test.
 
     Usage:
@@ -97,8 +253,16 @@ def screenshot(page: Page, request: pytest.FixtureRequest, screenshots_dir: Path
 
     This will save a screenshot to 'screenshots/{test_name}__0001_homepage.jpeg'. Each
     subsequent call to screenshot within the same test will increment the step number.
+
+    The capture is skipped when the same page, with the same viewport and
+    options, was already captured by this or previous run. Existing image is
+    reused instead, as recorded by the manifest of the screenshots directory.
     """
     step = 1
+    directory = screenshots_dir.resolve()
+    if directory not in screenshot_manifests:
+        screenshot_manifests[directory] = ScreenshotManifest(directory)
+    manifest = screenshot_manifests[directory]
 
     def func(name: str, _page: Page | None = None, /, **kwargs: Any):
         """Takes a screenshot and saves it to the test-results directory."""
@@ -110,9 +274,23 @@ def screenshot(page: Page, request: pytest.FixtureRequest, screenshots_dir: Path
         prefix: str = node.originalname[5:]  # pyright: ignore[reportUnknownVariableType]
         if "path" not in kwargs:
             kwargs["path"] = f"{screenshots_dir}/{prefix}__{step:04d}_{name}.jpeg"
+        key = f"{node.nodeid}::{step:04d}_{name}"
         step += 1
         kwargs.setdefault("full_page", True)
-        return _page.screenshot(**kwargs)
+
+        path = Path(kwargs["path"]).resolve()
+        digest = page_digest(_page, kwargs)
+        stored = manifest.find(digest)
+        if stored is None:
+            result = _page.screenshot(**kwargs)
+        else:
+            if stored != path:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(stored, path)
+            result = path.read_bytes()
+
+        manifest.record(key, digest, path)
+        return result
 
     return func
 
@@ -0,0 +1,176 @@
+"""De-duplication of screenshots taken by page tests.
+
+Before the capture, the DOM of the page is normalized and hashed together with
+the state of form controls, contents of stylesheets, scripts, images and other
+assets loaded by the page, the viewport and screenshot options. When a
+screenshot with the same hash was already stored by the current or any
+previous run, the capture is skipped and the stored image is reused. The manifest of the screenshots directory maps
+every test step to its image and hash. Delete the manifest to capture all
+screenshots again.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from playwright.sync_api import Page
+
+MANIFEST = ".manifest.json"
+
+# hashes of assets by URL. Assets do not change while the server is running,
+# so every asset is downloaded once per session
+_asset_digests: dict[str, str] = {}
+
+# values that change between renders of the same page
+_volatile = [
+    (re.compile(r'(name="_csrf_token"[^>]*?(?:value|content)=")[^"]*'), r"\1"),
+    (re.compile(r'(nonce=")[^"]*'), r"\1"),
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"), "<uuid>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?"), "<datetime>"),
+]
+
+# options of `Page.screenshot` that do not affect the image
+_ignored_options = {"path", "timeout"}
+
+
+def normalize(content: str) -> str:
+    """Remove values that change between renders of the same page."""
+    for pattern, replacement in _volatile:
+        content = pattern.sub(replacement, content)
+    return content
+
+
+def asset_digests(page: Page) -> dict[str, str]:
+    """Hash contents of assets loaded by the page.
+
+    Besides stylesheets, scripts and images of the document, resources
+    requested by them, e.g. fonts and backgrounds referenced via CSS `url()`,
+    are included. Data URLs are already a part of the DOM.
+    """
+    urls: list[str] = page.evaluate(
+        """() => [
+            ...Array.from(document.querySelectorAll("link[rel=stylesheet][href]"), (el) => el.href),
+            ...Array.from(document.querySelectorAll("script[src]"), (el) => el.src),
+            ...Array.from(document.images, (el) => el.currentSrc || el.src),
+            ...performance.getEntriesByType("resource")
+                .filter((entry) => !["xmlhttprequest", "fetch", "beacon"].includes(entry.initiatorType))
+                .map((entry) => entry.name),
+        ]"""
+    )
+    urls = sorted({url for url in urls if url and not url.startswith("data:")})
+    for url in urls:
+        if url not in _asset_digests:
+            response = page.request.get(url)
+            content = response.body() if response.ok else str(response.status).encode()
+            _asset_digests[url] = hashlib.sha256(content).hexdigest()
+
+    return {url: _asset_digests[url] for url in urls}
+
+
+def control_states(page: Page) -> list[Any]:
+    """Get values of form controls, which are not reflected by the DOM markup.
+
+    `Page.fill`, `check` and `select_option` change properties of controls,
+    while their attributes stay the same.
+    """
+    return page.evaluate(
+        """() => Array.from(
+            document.querySelectorAll("input:not([type=hidden]), textarea, select"),
+            (el) => el.tagName === "SELECT"
+                ? Array.from(el.options, (option) => option.selected)
+                : [el.value, el.checked],
+        )"""
+    )
+
+
+def page_digest(page: Page, options: dict[str, Any]) -> str:
+    """Hash the normalized DOM, state of controls, assets, the viewport and screenshot options."""
+    data = {
+        "dom": normalize(page.content()),
+        "controls": control_states(page),
+        "assets": asset_digests(page),
+        "viewport": page.viewport_size,
+        "options": {key: value for key, value in options.items() if key not in _ignored_options},
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ScreenshotManifest:
+    """Stored screenshots of test steps and hashes of pages they show.
+
+    Paths are relative to the directory of the manifest.
+    """
+
+    path: Path
+    steps: dict[str, dict[str, str]]
+
+    def __init__(self, directory: Path):
+        self.path = directory / MANIFEST
+        self.steps = self._read()
+
+    def _read(self) -> dict[str, dict[str, str]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def find(self, digest: str) -> Path | None:
+        """Get existing screenshot of the page with the given hash."""
+        for entry in self.steps.values():
+            if entry["hash"] != digest:
+                continue
+
+            image = self.path.parent / entry["path"]
+            if image.is_file():
+                return image
+
+        return None
+
+    def record(self, step: str, digest: str, image: Path):
+        """Remember the screenshot of the test step.
+
+        Steps that stored a different page in the same image are forgotten.
+        """
+        path = os.path.relpath(image, self.path.parent)
+        self.steps = {
+            key: entry for key, entry in self.steps.items() if entry["path"] != path or entry["hash"] == digest
+        }
+        self.steps[step] = {"hash": digest, "path": path}
+
+    @contextlib.contextmanager
+    def _lock(self) -> Iterator[None]:
+        """Hold exclusive lock of the manifest, shared with concurrent sessions."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(MANIFEST + ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self):
+        """Write the manifest, keeping steps recorded by concurrent sessions.
+
+        Sessions, e.g. pytest-xdist workers, merge their steps one by one
+        under the lock, and the manifest is replaced atomically, so it is
+        never read partially written.
+        """
+        images = {entry["path"]: entry["hash"] for entry in self.steps.values()}
+        with self._lock():
+            steps = {
+                key: entry
+                for key, entry in self._read().items()
+                if images.get(entry["path"], entry["hash"]) == entry["hash"]
+            }
+            steps.update(self.steps)
+
+            with tempfile.NamedTemporaryFile("w", dir=self.path.parent, suffix=".tmp", delete=False) as dest:
+                dest.write(json.dumps(steps, indent=2, sort_keys=True))
+            os.replace(dest.name, self.path)
@@ -0,0 +1,145 @@
+"""Isolation of page tests executed by pytest-xdist workers.
+
+Every worker, e.g. `gw3`, is a shard of the suite with its own CKAN server,
+database schema and search site ID. Resources are derived from the worker
+number and the original configuration, and exported as environment variables
+before CKAN reads its config file, so that the test process and the server
+started by it share the same isolated resources.
+
+Without pytest-xdist, or with `-n 0`, tests use the server and database from
+the original configuration.
+"""
+
+import contextlib
+import dataclasses
+import os
+import shutil
+import socket
+import subprocess
+import time
+from collections.abc import Iterator
+from urllib.parse import urlsplit, urlunsplit
+
+import sqlalchemy as sa
+
+# seconds to wait until the worker's server accepts connections
+SERVER_TIMEOUT = 60
+
+
+@dataclasses.dataclass(frozen=True)
+class WorkerResources:
+    """Resources allocated to a single pytest-xdist worker.
+
+    :param worker: ID of the worker, or empty string when tests are not
+        distributed.
+    :param site_url: URL of the CKAN server used by the worker.
+    :param site_id: Site ID that separates datasets of the worker inside the
+        shared search index.
+    :param schema: Database schema of the worker.
+    :param db_url: Database URL that uses the schema of the worker.
+    """
+
+    worker: str = ""
+    site_url: str = ""
+    site_id: str = ""
+    schema: str = ""
+    db_url: str = ""
+
+    @property
+    def sharded(self) -> bool:
+        """Tests are distributed between workers."""
+        return bool(self.worker)
+
+    @property
+    def port(self) -> int:
+        return urlsplit(self.site_url).port or 80
+
+    def qualify(self, name: str) -> str:
+        """Make the name of shared resource unique for the worker."""
+        return f"{name}_{self.worker}" if self.worker else name
+
+
+def allocate(worker: str, site_url: str, site_id: str, db_url: str) -> WorkerResources:
+    """Derive resources of the worker from the original configuration.
+
+    Ports are allocated after the port of the original server, i.e. worker
+    `gw0` of the server running on port 5000 gets port 5001.
+    """
+    if not worker:
+        return WorkerResources()
+
+    index = int(worker.removeprefix("gw"))
+    parts = urlsplit(site_url)
+    port = (parts.port or 80) + index + 1
+    url = urlunsplit(parts._replace(netloc=f"{parts.hostname}:{port}"))
+
+    schema = f"theming_{worker}"
+    db = sa.engine.make_url(db_url)
+    db = db.update_query_dict({"options": f"-csearch_path={schema}"})
+
+    return WorkerResources(
+        worker=worker,
+        site_url=url,
+        site_id=f"{site_id}-{worker}",
+        schema=schema,
+        db_url=db.render_as_string(hide_password=False),
+    )
+
+
+def export(resources: WorkerResources, base_db_url: str):
+    """Create the schema of the worker and override CKAN config via environment variables."""
+    engine = sa.create_engine(base_db_url)
+    try:
+        with engine.begin() as conn:
+            conn.execute(sa.text(f'CREATE SCHEMA IF NOT EXISTS "{resources.schema}"'))
+    finally:
+        engine.dispose()
+
+    os.environ.update(
+        {
+            "CKAN_SITE_URL": resources.site_url,
+            "CKAN_SITE_ID": resources.site_id,
+            "CKAN_SQLALCHEMY_URL": resources.db_url,
+        }
+    )
+
+
+def _wait_for_server(proc: subprocess.Popen[bytes], host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        if proc.poll() is not None:
+            msg = f"CKAN server exited with code {proc.returncode}"
+            raise RuntimeError(msg)
+
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+@contextlib.contextmanager
+def run_server(resources: WorkerResources, ckan_ini: str, log: str) -> Iterator[subprocess.Popen[bytes]]:
+    """Start CKAN server of the worker and stop it on exit.
+
+    Server inherits environment of the worker, so it uses the same database
+    schema and search site ID.
+    """
+    host = urlsplit(resources.site_url).hostname or "localhost"
+    with open(log, "wb") as output:
+        proc = subprocess.Popen(  # noqa: S603
+            [shutil.which("ckan") or "ckan", "-c", ckan_ini, "run", "-H", "0.0.0.0", "-p", str(resources.port)],  # noqa: S104
+            stdout=output,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            _wait_for_server(proc, host, resources.port, SERVER_TIMEOUT)
+            yield proc
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
@@ -0,0 +1,150 @@
+"""Snapshots of the database and search index for page tests.
+
+Seeding the database through factories and indexing datasets one by one are
+the slowest parts of page tests. Data is created once per session, copied into
+a separate schema of the same database and restored before every test, while
+datasets are restored into the search index in a single batch, only when the
+index was changed since the previous restore.
+"""
+
+import contextlib
+import copy
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+import sqlalchemy as sa
+
+import ckan.plugins.toolkit as tk
+from ckan import model
+from ckan.lib.search import clear_all
+from ckan.lib.search.common import make_connection
+from ckan.lib.search.index import PackageSearchIndex
+
+
+class DatabaseSnapshot:
+    """Copy of every table of the database, stored in a separate schema.
+
+    Rows are copied by the database server, so taking and restoring of the
+    snapshot does not depend on the amount of data.
+    """
+
+    engine: sa.Engine
+    schema: str
+    tables: list[str]
+    sequences: dict[str, int | None]
+
+    def __init__(self, engine: sa.Engine, schema: str):
+        self.engine = engine
+        self.schema = schema
+        self.tables = []
+        self.sequences = {}
+
+    def _quote(self, name: str) -> str:
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def take(self):
+        """Copy current content of the database into the snapshot."""
+        metadata = sa.MetaData()
+        metadata.reflect(self.engine)
+        # parent tables go first, so that rows can be restored without
+        # violation of foreign keys
+        self.tables = [table.name for table in metadata.sorted_tables]
+
+        schema = self._quote(self.schema)
+        with self.engine.begin() as conn:
+            conn.execute(sa.text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.execute(sa.text(f"CREATE SCHEMA {schema}"))
+            for name in self.tables:
+                conn.execute(sa.text(f"CREATE TABLE {schema}.{self._quote(name)} AS TABLE {self._quote(name)}"))
+
+            rows = conn.execute(
+                sa.text(
+                    "SELECT schemaname, sequencename, last_value FROM pg_sequences"
+                    + " WHERE schemaname = current_schema()"
+                )
+            )
+            self.sequences = {f"{self._quote(row[0])}.{self._quote(row[1])}": row[2] for row in rows}
+
+    def restore(self):
+        """Replace content of the database with the snapshot."""
+        model.Session.remove()
+        schema = self._quote(self.schema)
+        with self.engine.begin() as conn:
+            conn.execute(sa.text("TRUNCATE " + ", ".join(map(self._quote, self.tables)) + " CASCADE"))
+            for name in self.tables:
+                conn.execute(sa.text(f"INSERT INTO {self._quote(name)} SELECT * FROM {schema}.{self._quote(name)}"))
+
+            for name, value in self.sequences.items():
+                if value is None:
+                    conn.execute(sa.text("SELECT setval(:name, 1, false)"), {"name": name})
+                else:
+                    conn.execute(sa.text("SELECT setval(:name, :value)"), {"name": name, "value": value})
+
+    def drop(self):
+        """Remove the snapshot from the database."""
+        with self.engine.begin() as conn:
+            conn.execute(sa.text(f"DROP SCHEMA IF EXISTS {self._quote(self.schema)} CASCADE"))
+
+
+class SearchSnapshot:
+    """Datasets indexed during seeding, restored into the search index in a batch.
+
+    Pages are rendered by a separate CKAN server, so the search index itself
+    must contain datasets. While recording, datasets are stored in memory
+    instead of being sent to Solr one by one, and on restore they are
+    indexed again with a single commit, without rendering them via
+    `package_show`.
+
+    Most tests only read the index, so the restore is skipped while the
+    number of documents of the site and the time of the latest indexing
+    stay the same as after the previous restore.
+    """
+
+    documents: dict[str, dict[str, Any]]
+    fingerprint: tuple[int, Any] | None
+
+    def __init__(self):
+        self.documents = {}
+        self.fingerprint = None
+
+    def _fingerprint(self) -> tuple[int, Any]:
+        """Number of documents of the site and the time of the latest indexing."""
+        site_id = tk.config["ckan.site_id"]
+        result = make_connection().search(
+            q="*:*", fq=f'+site_id:"{site_id}"', fl="indexed_ts", sort="indexed_ts desc", rows=1
+        )
+        return result.hits, result.docs[0]["indexed_ts"] if result.docs else None
+
+    @contextlib.contextmanager
+    def record(self) -> Iterator["SearchSnapshot"]:  # noqa: UP037 Forward Reference
+        """Temporarily store indexed datasets instead of sending them to Solr."""
+        snapshot = self
+
+        def index_package(self: PackageSearchIndex, pkg_dict: dict[str, Any], defer_commit: bool = False):
+            snapshot.documents[pkg_dict["id"]] = copy.deepcopy(pkg_dict)
+
+        def delete_package(self: PackageSearchIndex, pkg_dict: dict[str, Any]):
+            snapshot.documents.pop(pkg_dict["id"], None)
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(PackageSearchIndex, "index_package", index_package)
+            mp.setattr(PackageSearchIndex, "delete_package", delete_package)
+            mp.setattr(PackageSearchIndex, "commit", lambda self: None)
+            yield self
+
+    def restore(self):
+        """Replace content of the search index with recorded datasets.
+
+        Nothing is done when the index is unchanged since the previous
+        restore.
+        """
+        if self.fingerprint and self.fingerprint == self._fingerprint():
+            return
+
+        clear_all()
+        index = PackageSearchIndex()
+        for pkg_dict in self.documents.values():
+            index.index_package(copy.deepcopy(pkg_dict), defer_commit=True)
+        index.commit()
+        self.fingerprint = self._fingerprint()
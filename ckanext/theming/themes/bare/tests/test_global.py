@@ -6,48 +6,20 @@ from playwright.sync_api import Page
 from werkzeug.routing.rules import Rule
 
 import ckan.plugins.toolkit as tk
-from ckan.types import FixtureApp, FixtureCkanConfig, TestFactory
+from ckan.types import FixtureApp
 
 from ckanext.theming import reference
 
 
 @pytest.fixture
-def source_data(
-    user_factory: TestFactory,
-    package_factory: TestFactory,
-    group_factory: TestFactory,
-    organization_factory: TestFactory,
-    resource_factory: TestFactory,
-    resource_view_factory: TestFactory,
-    ckan_config: FixtureCkanConfig,
-):
+def source_data(seeded_db: dict[str, Any]):
     source = reference.get_source()
-
-    page_size = ckan_config["ckan.datasets_per_page"]
-    users = user_factory.create_batch(page_size + 1)
-    groups = group_factory.create_batch(page_size + 1, users=[{"name": users[0]["id"], "capacity": "member"}])
-    organizations = organization_factory.create_batch(
-        page_size + 1, users=[{"name": users[0]["id"], "capacity": "member"}]
-    )
-    packages = package_factory.create_batch(page_size + 1, owner_org=organizations[0]["id"])
-    resources = resource_factory.create_batch(2, package_id=packages[0]["id"])
-    views = resource_view_factory.create_batch(2, resource_id=resources[0]["id"])
-
-    source.data.update(
-        {
-            "resource": resources[0],
-            "package": packages[0],
-            "resource_view": views[0],
-            "group": groups[0],
-            "organization": organizations[0],
-            "user": users[0],
-        }
-    )
+    source.data.update(seeded_db)
     return source
 
 
 @pytest.mark.integration
-@pytest.mark.usefixtures("with_plugins", "clean_db", "clean_index")
+@pytest.mark.usefixtures("with_plugins")
 class TestPages:
     def test_screenshots(  # noqa: PLR0913, C901
         self,
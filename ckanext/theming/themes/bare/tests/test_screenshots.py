@@ -0,0 +1,102 @@
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from ckanext.theming.themes.bare.tests import screenshots
+from ckanext.theming.themes.bare.tests.screenshots import ScreenshotManifest, normalize
+
+
+class FakePage:
+    """Page with form controls and assets, as reported by the browser."""
+
+    def __init__(self, controls: list[Any], assets: dict[str, bytes]):
+        self.controls = controls
+        self.assets = assets
+        self.viewport_size = {"width": 1280, "height": 720}
+        self.request = SimpleNamespace(get=lambda url: SimpleNamespace(ok=True, body=lambda: self.assets[url]))
+
+    def content(self) -> str:
+        return '<form><input name="title"></form><img src="/logo.png">'
+
+    def evaluate(self, script: str) -> Any:
+        return self.controls if 'querySelectorAll("input' in script else list(self.assets)
+
+
+@pytest.mark.unit
+def test_normalize():
+    """Tokens, nonces, UUIDs and timestamps are removed from the page."""
+    first = (
+        '<input name="_csrf_token" type="hidden" value="abc"><script nonce="xyz"></script>'
+        + '<a href="/dataset/2a5b84a0-0a8c-4c3d-9a4c-7c0a1c4e1f10">2024-01-01T12:00:00.123</a>'
+    )
+    second = (
+        '<input name="_csrf_token" type="hidden" value="def"><script nonce="uvw"></script>'
+        + '<a href="/dataset/d1f4c7a2-5b3e-4e8f-8c2d-1a9b0e6f3c47">2025-02-03T04:05:06</a>'
+    )
+    assert normalize(first) == normalize(second)
+    assert normalize("<p>Dataset</p>") != normalize("<p>Group</p>")
+
+
+@pytest.mark.unit
+def test_find(tmp_path: Path):
+    """Only images that exist on disk are reused."""
+    manifest = ScreenshotManifest(tmp_path)
+    manifest.record("test::0001_home", "home", tmp_path / "home.jpeg")
+    assert manifest.find("home") is None
+
+    (tmp_path / "home.jpeg").write_bytes(b"image")
+    assert manifest.find("home") == tmp_path / "home.jpeg"
+    assert manifest.find("other") is None
+
+
+@pytest.mark.unit
+def test_record(tmp_path: Path):
+    """Steps that stored a different page in the same image are forgotten."""
+    manifest = ScreenshotManifest(tmp_path)
+    manifest.record("first::0001_home", "old", tmp_path / "home.jpeg")
+    manifest.record("second::0001_home", "old", tmp_path / "home.jpeg")
+    manifest.record("third::0001_about", "about", tmp_path / "about.jpeg")
+
+    manifest.record("first::0001_home", "new", tmp_path / "home.jpeg")
+    assert manifest.steps == {
+        "first::0001_home": {"hash": "new", "path": "home.jpeg"},
+        "third::0001_about": {"hash": "about", "path": "about.jpeg"},
+    }
+
+
+@pytest.mark.unit
+def test_save(tmp_path: Path):
+    """Steps of concurrent sessions are merged into the manifest."""
+    first = ScreenshotManifest(tmp_path)
+    second = ScreenshotManifest(tmp_path)
+    first.record("first::0001_home", "home", tmp_path / "home.jpeg")
+    second.record("second::0001_about", "about", tmp_path / "about.jpeg")
+
+    first.save()
+    second.save()
+    assert ScreenshotManifest(tmp_path).steps == {**first.steps, **second.steps}
+
+
+@pytest.mark.unit
+class TestPageDigest:
+    @pytest.fixture(autouse=True)
+    def assets(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(screenshots, "_asset_digests", {})
+
+    def test_controls(self):
+        """Filled form is not confused with the empty one."""
+        empty: Any = FakePage([["", False]], {"/logo.png": b"logo"})
+        filled: Any = FakePage([["Dataset", False]], {"/logo.png": b"logo"})
+        assert screenshots.page_digest(empty, {}) != screenshots.page_digest(filled, {})
+        assert screenshots.page_digest(empty, {}) == screenshots.page_digest(empty, {})
+
+    def test_assets(self):
+        """Changed image produces a different hash."""
+        page: Any = FakePage([], {"/logo.png": b"old"})
+        old = screenshots.page_digest(page, {})
+        screenshots._asset_digests.clear()  # pyright: ignore[reportPrivateUsage]
+        page.assets["/logo.png"] = b"new"
+        new = screenshots.page_digest(page, {})
+        assert old != new
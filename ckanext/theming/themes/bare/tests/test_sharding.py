@@ -0,0 +1,41 @@
+import pytest
+import sqlalchemy as sa
+
+from ckanext.theming.themes.bare.tests import sharding
+
+SITE_URL = "http://ckan:5000/"
+DB_URL = "postgresql://ckan:pass@db/ckan_test"
+
+
+@pytest.mark.unit
+class TestAllocate:
+    def test_first_worker(self):
+        """The first worker gets the port after the original server."""
+        resources = sharding.allocate("gw0", SITE_URL, "default", DB_URL)
+        assert resources.sharded
+        assert resources.site_url == "http://ckan:5001/"
+        assert resources.port == 5001  # noqa: PLR2004
+        assert resources.site_id == "default-gw0"
+        assert resources.schema == "theming_gw0"
+
+    def test_database(self):
+        """Database URL keeps credentials and selects the schema of the worker."""
+        resources = sharding.allocate("gw3", SITE_URL, "default", DB_URL)
+        url = sa.engine.make_url(resources.db_url)
+        assert url.render_as_string(hide_password=False).startswith(DB_URL)
+        assert url.query["options"] == "-csearch_path=theming_gw3"
+        assert resources.site_url == "http://ckan:5004/"
+        assert resources.site_id == "default-gw3"
+
+    def test_not_distributed(self):
+        """Without a worker, resources are empty and the original configuration is used."""
+        resources = sharding.allocate("", SITE_URL, "default", DB_URL)
+        assert resources == sharding.WorkerResources()
+        assert not resources.sharded
+
+
+@pytest.mark.unit
+def test_qualify():
+    """Names of shared resources get the suffix of the worker."""
+    assert sharding.allocate("gw3", SITE_URL, "default", DB_URL).qualify("snapshot") == "snapshot_gw3"
+    assert sharding.WorkerResources().qualify("snapshot") == "snapshot"
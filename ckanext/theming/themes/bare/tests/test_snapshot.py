@@ -0,0 +1,69 @@
+from collections.abc import Iterator
+from unittest import mock
+
+import pytest
+
+from ckan import model
+from ckan.lib import search
+from ckan.tests import factories
+
+from ckanext.theming.themes.bare.tests import sharding
+from ckanext.theming.themes.bare.tests.snapshot import DatabaseSnapshot, SearchSnapshot
+
+
+@pytest.fixture
+def snapshot(clean_db: None, worker_resources: sharding.WorkerResources) -> Iterator[DatabaseSnapshot]:
+    snapshot = DatabaseSnapshot(model.meta.engine, worker_resources.qualify("theming_snapshot_test"))
+    yield snapshot
+    snapshot.drop()
+
+
+def _system_info_id(key: str) -> int:
+    model.system_info.set_system_info(key, "value")
+    return model.Session.query(model.SystemInfo).filter_by(key=key).one().id
+
+
+@pytest.mark.integration
+class TestDatabaseSnapshot:
+    def test_rows_are_restored(self, snapshot: DatabaseSnapshot):
+        """Rows created after the snapshot are removed and existing rows are kept."""
+        kept = factories.User()
+        snapshot.take()
+        removed = factories.User()
+
+        snapshot.restore()
+        ids = {item.id for item in model.Session.query(model.User)}
+        assert kept["id"] in ids
+        assert removed["id"] not in ids
+
+    def test_sequences_are_restored(self, snapshot: DatabaseSnapshot):
+        """Sequences continue from the value they had when the snapshot was taken."""
+        first = _system_info_id("theming_first")
+        snapshot.take()
+        second = _system_info_id("theming_second")
+
+        snapshot.restore()
+        assert _system_info_id("theming_third") == second
+        assert second > first
+
+
+@pytest.mark.integration
+class TestSearchSnapshot:
+    def test_restore_only_changed_index(self, clean_db: None, monkeypatch: pytest.MonkeyPatch):
+        """Index is rebuilt only when it was changed since the previous restore."""
+        snapshot = SearchSnapshot()
+        with snapshot.record():
+            dataset = factories.Dataset()
+
+        clear_all = mock.Mock(wraps=search.clear_all)
+        monkeypatch.setattr("ckanext.theming.themes.bare.tests.snapshot.clear_all", clear_all)
+
+        snapshot.restore()
+        snapshot.restore()
+        assert clear_all.call_count == 1
+        assert search.query_for(model.Package).get_all_entity_ids() == [dataset["id"]]
+
+        factories.Dataset()
+        snapshot.restore()
+        assert clear_all.call_count == 2  # noqa: PLR2004
+        assert search.query_for(model.Package).get_all_entity_ids() == [dataset["id"]]